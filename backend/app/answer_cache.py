@@ -0,0 +1,83 @@
+from __future__ import annotations
+import os, time, threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+def store_fingerprint(path: Optional[str]) -> tuple:
+    """mtime/size of the files in a FAISS store directory; changes whenever the store is rebuilt."""
+    if not path or not os.path.isdir(path):
+        return ()
+    entries = []
+    for name in sorted(os.listdir(path)):
+        full = os.path.join(path, name)
+        if os.path.isfile(full):
+            st = os.stat(full)
+            entries.append((name, st.st_mtime_ns, st.st_size))
+    return tuple(entries)
+
+
+class SemanticAnswerCache:
+    """Answers keyed by question embedding: a lookup hits when a cached question's cosine similarity
+    is at least `threshold`.
+
+    Entries live in per-pipeline namespaces, are evicted least-recently-used beyond `max_size` or
+    after `ttl` seconds, and are all dropped when the vector store fingerprint changes.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_size: int = 512, ttl: float = 86400):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, tuple[str, np.ndarray, str, float]] = OrderedDict()
+        self._next_id = 0
+        self._fingerprint: tuple = ()
+        self._lock = threading.Lock()
+
+    def _check_store(self, fingerprint: tuple) -> None:
+        if fingerprint != self._fingerprint:
+            self._entries.clear()
+            self._fingerprint = fingerprint
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def get(self, namespace: str, vector: Sequence[float], fingerprint: tuple) -> Optional[str]:
+        query = self._unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            self._check_store(fingerprint)
+            best_id, best_score = None, self.threshold
+            for entry_id, (ns, v, _, expires) in list(self._entries.items()):
+                if expires < now:
+                    del self._entries[entry_id]
+                    continue
+                if ns == namespace:
+                    score = float(np.dot(query, v))
+                    if score >= best_score:
+                        best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][2]
+
+    def put(self, namespace: str, vector: Sequence[float], answer: str, fingerprint: tuple) -> None:
+        with self._lock:
+            self._check_store(fingerprint)
+            self._entries[self._next_id] = (namespace, self._unit(vector), answer, time.monotonic() + self.ttl)
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -1,52 +1,67 @@
-from crewai import Agent
+MANAGER_ROLE = "Legal Consultation Manager"
+MANAGER_GOAL = "Supervise and finalize legal consultations to ensure they are complete, legally accurate, and clear to a Saudi citizen."
+MANAGER_BACKSTORY = (
+    "You are a senior legal consultant at a prestigious Saudi law firm. "
+    "You review all legal responses before they are delivered to the client. "
+    "Youmake sure that all listed url are VALID AND CORRECT. "
+    "You have deep knowledge of Saudi labor law, civil law, and administrative regulations. "
+    "You ensure clarity, accuracy, and completeness in every consultation."
+)
+
+RESEARCHER_ROLE = "Legal Research Specialist"
+RESEARCHER_GOAL = "Analyze the user’s question and identify relevant legal texts with metadata."
+
+WRITER_ROLE = "Legal Response Writer"
+WRITER_GOAL = "Generate professional legal answers in Arabic with clear structure and citations."
+WRITER_BACKSTORY = (
+    "You are a skilled legal writer with deep understanding of Saudi law. "
+    "You write responses that are clear, accurate, and easy for the general public to understand.\n\n"
+    "You will use the output from the researcher to write a legal consultation. "
+    "Each answer should include a direct response, followed by explanation and citations.\n"
+    "Always reference the law name, article number/title, and include a VALID AND CORRECT source URL when available. "
+    "If the content is vague, use your legal reasoning to formulate helpful answers based on principles."
+"At the very end of every consultation, sign off with:\n\n"
+"مع أطيب التحيات،\n"
+"قانونيد"
+)
+
+
+def researcher_backstory(user_question, extracted_chunks):
+    return (
+        f"User Question:\n{user_question}\n\n"
+        f"You have access to {len(extracted_chunks)} legal snippets, each containing:\n"
+"- Law name\n- Article title or number\n- Article content\n- Amendments (if present)\n-  VALID AND CORRECT URL (if available)\n\n"
+"Your task is to identify the most relevant articles related to the user's question. "
+"If direct matches aren't found, extract general principles, definitions, or summaries from relevant laws. "
+"If an article has amendments, include them as historical or alternative views.\n"
+"You must always attach the law name, article number/title, and a VALID AND CORRECT source URL if possible.")
+
 
 def get_agents(llm, user_question, extracted_chunks):
+    from crewai import Agent   # imported on first use so importing the prompts stays cheap
+
     manager = Agent(
-        role="Legal Consultation Manager",
-        goal="Supervise and finalize legal consultations to ensure they are complete, legally accurate, and clear to a Saudi citizen.",
-        backstory=(
-            "You are a senior legal consultant at a prestigious Saudi law firm. "
-            "You review all legal responses before they are delivered to the client. "
-            "Youmake sure that all listed url are VALID AND CORRECT. "
-            "You have deep knowledge of Saudi labor law, civil law, and administrative regulations. "
-            "You ensure clarity, accuracy, and completeness in every consultation."
-        ),
+        role=MANAGER_ROLE,
+        goal=MANAGER_GOAL,
+        backstory=MANAGER_BACKSTORY,
         llm=llm,
         allow_delegation=True
     )
 
     researcher = Agent(
-        role="Legal Research Specialist",
-        goal="Analyze the user’s question and identify relevant legal texts with metadata.",
-        backstory=(
-            f"User Question:\n{user_question}\n\n"
-            f"You have access to {len(extracted_chunks)} legal snippets, each containing:\n"
-"- Law name\n- Article title or number\n- Article content\n- Amendments (if present)\n-  VALID AND CORRECT URL (if available)\n\n"
-"Your task is to identify the most relevant articles related to the user's question. "
-"If direct matches aren't found, extract general principles, definitions, or summaries from relevant laws. "
-"If an article has amendments, include them as historical or alternative views.\n"
-"You must always attach the law name, article number/title, and a VALID AND CORRECT source URL if possible."),
+        role=RESEARCHER_ROLE,
+        goal=RESEARCHER_GOAL,
+        backstory=researcher_backstory(user_question, extracted_chunks),
         llm=llm,
         allow_delegation=False
     )
 
     writer = Agent(
-        role="Legal Response Writer",
-        goal="Generate professional legal answers in Arabic with clear structure and citations.",
-        backstory=(
-            "You are a skilled legal writer with deep understanding of Saudi law. "
-            "You write responses that are clear, accurate, and easy for the general public to understand.\n\n"
-            "You will use the output from the researcher to write a legal consultation. "
-            "Each answer should include a direct response, followed by explanation and citations.\n"
-            "Always reference the law name, article number/title, and include a VALID AND CORRECT source URL when available. "
-            "If the content is vague, use your legal reasoning to formulate helpful answers based on principles."
-        "At the very end of every consultation, sign off with:\n\n"
-        "مع أطيب التحيات،\n"
-        "قانونيد"
-    
-        ),
+        role=WRITER_ROLE,
+        goal=WRITER_GOAL,
+        backstory=WRITER_BACKSTORY,
         llm=llm,
         allow_delegation=False
     )
 
-    return manager, researcher, writer
\ No newline at end of file
+    return manager, researcher, writer
@@ -1,33 +1,81 @@
-from fastapi import APIRouter, HTTPException
+import json
+from typing import Dict, List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 
-from backend.app.services import run_chat, run_chat_stream
+from backend.app.services import run_chat, run_chat_stream, check_filters
+from backend.app.retrieval.filters import RetrievalFilter, UnknownFilterError
 
 router = APIRouter(tags=["chat"])
+PipelineMode = Literal["single", "two_call", "crew"]
+
 class ChatRequest(BaseModel):
     question: str
+    mode: Optional[PipelineMode] = None   # defaults to CHAT_PIPELINE_MODE
+    # Optional retrieval filters: only these laws / this law category, without amendment text
+    law_ids: Optional[List[str]] = None
+    category: Optional[str] = None
+    exclude_amendments: bool = False
 
 class ChatResponse(BaseModel):
     answer: str
+    cached: bool = False
+    mode: str
+    timings: Dict[str, float] = {}     # per-stage latency in ms
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(payload: ChatRequest):
     try:
-        answer = await run_chat(payload.question)
-        return {"answer": answer}
+        filters = RetrievalFilter.of(payload.law_ids, payload.category, payload.exclude_amendments)
+        await check_filters(filters)
+        return await run_chat(payload.question, mode=payload.mode, filters=filters)
+    except UnknownFilterError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:  
         raise HTTPException(status_code=500, detail=str(exc))
 
 from fastapi.responses import StreamingResponse
 
+
+def _sse(data: str, event: str | None = None) -> str:
+    """One SSE message; every line of a multi-line payload gets its own data: field."""
+    lines = [f"event: {event}"] if event else []
+    data = data.replace("\r\n", "\n").replace("\r", "\n")
+    lines += [f"data: {line}" for line in data.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
+
 @router.get("/chat/stream")
-async def chat_stream(question: str):
+async def chat_stream(
+    question: str,
+    mode: Optional[PipelineMode] = None,
+    law_ids: Optional[List[str]] = Query(None),
+    category: Optional[str] = None,
+    exclude_amendments: bool = False,
+):
+    """Stream the chat pipeline as SSE.
+
+    "progress" events carry JSON stage updates, "token" events carry raw answer text as it is
+    generated, and "done" closes the stream (JSON with the mode, the cached flag and per-stage
+    "timings" in ms: lookup, or embedding, retrieval and the pipeline's stages).
+    """
+    filters = RetrievalFilter.of(law_ids, category, exclude_amendments)
+    try:
+        await check_filters(filters)
+    except UnknownFilterError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
     async def event_generator():
         try:
-            async for chunk in run_chat_stream(question):
-                yield f"data: {chunk}\n\n"
+            async for event, data in run_chat_stream(question, mode=mode, filters=filters):
+                payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+                yield _sse(payload, event)
         except Exception as exc:
-            yield f"event: error\ndata: {str(exc)}\n\n"
+            yield _sse(str(exc), "error")
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
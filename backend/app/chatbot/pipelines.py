@@ -0,0 +1,91 @@
+"""Direct-call alternatives to the three-agent chat crew.
+
+Every mode reuses the crew's prompts (agents.py / tasks.py) so answers follow the same citation
+rules; the lighter modes just make fewer, direct LLM calls:
+
+* "single"   – one call that selects the relevant articles and writes the consultation.
+* "two_call" – researcher call, then writer call.
+* "crew"     – the full researcher → writer → manager crew (tasks.create_crew).
+"""
+from __future__ import annotations
+import time
+
+from backend.app.chatbot.agents import (
+    MANAGER_ROLE, MANAGER_GOAL, MANAGER_BACKSTORY,
+    RESEARCHER_ROLE, RESEARCHER_GOAL, researcher_backstory,
+    WRITER_ROLE, WRITER_GOAL, WRITER_BACKSTORY,
+)
+from backend.app.retrieval.context_packer import format_context
+from backend.app.chatbot.tasks import (
+    research_description, RESEARCH_EXPECTED_OUTPUT,
+    WRITING_DESCRIPTION, WRITING_EXPECTED_OUTPUT,
+    REVIEW_DESCRIPTION, REVIEW_EXPECTED_OUTPUT, BOE_URL_RULE,
+)
+
+PIPELINE_MODES = ("single", "two_call", "crew")
+
+
+def elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _system(role: str, goal: str, backstory: str) -> str:
+    return f"You are the {role}. {goal}\n\n{backstory}"
+
+
+def research_messages(user_question, extracted_chunks):
+    return [
+        ("system", _system(RESEARCHER_ROLE, RESEARCHER_GOAL, researcher_backstory(user_question, extracted_chunks))),
+        ("human", f"{research_description(user_question, extracted_chunks)}\n\n"
+                  f"Expected output: {RESEARCH_EXPECTED_OUTPUT}\n\n"
+                  f"Legal snippets:\n{format_context(extracted_chunks)}"),
+    ]
+
+
+def writing_messages(user_question, research_output):
+    return [
+        ("system", _system(WRITER_ROLE, WRITER_GOAL, WRITER_BACKSTORY)),
+        ("human", f"User question:\n{user_question}\n\n{WRITING_DESCRIPTION}\n\n"
+                  f"Expected output: {WRITING_EXPECTED_OUTPUT}\n\n"
+                  f"Researcher's output:\n{research_output}"),
+    ]
+
+
+def single_call_messages(user_question, extracted_chunks):
+    # The writer persona does the researcher's selection itself; the reviewer's URL rule is folded in
+    return [
+        ("system", _system(WRITER_ROLE, WRITER_GOAL, WRITER_BACKSTORY)),
+        ("human", "First, do the research step:\n"
+                  f"{research_description(user_question, extracted_chunks)}\n\n"
+                  "Then write the answer (the researcher's output is your own analysis from the step above; do not include it):\n"
+                  f"{WRITING_DESCRIPTION}\n\n"
+                  f"{BOE_URL_RULE}\n"
+                  f"Expected output: {REVIEW_EXPECTED_OUTPUT} Reply with the consultation only.\n\n"
+                  f"Legal snippets:\n{format_context(extracted_chunks)}"),
+    ]
+
+
+def review_messages(draft):
+    """Chat messages for running the manager's review of `draft` as one direct (streamable) LLM call."""
+    return [
+        ("system", _system(MANAGER_ROLE, MANAGER_GOAL, MANAGER_BACKSTORY)),
+        ("human", f"{REVIEW_DESCRIPTION}\n\nExpected output: {REVIEW_EXPECTED_OUTPUT}\n\nConsultation:\n{draft}"),
+    ]
+
+
+async def run_single_call(llm, user_question, extracted_chunks) -> tuple[str, dict[str, float]]:
+    start = time.perf_counter()
+    answer = await llm.ainvoke(single_call_messages(user_question, extracted_chunks))
+    return answer.content, {"answer": elapsed_ms(start)}
+
+
+async def run_two_call(llm, user_question, extracted_chunks) -> tuple[str, dict[str, float]]:
+    timings = {}
+    start = time.perf_counter()
+    research = await llm.ainvoke(research_messages(user_question, extracted_chunks))
+    timings["research"] = elapsed_ms(start)
+
+    start = time.perf_counter()
+    answer = await llm.ainvoke(writing_messages(user_question, research.content))
+    timings["writing"] = elapsed_ms(start)
+    return answer.content, timings
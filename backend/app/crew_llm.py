@@ -0,0 +1,31 @@
+"""crewai.LLM that reads and writes the on-disk LLM cache.
+
+CrewAI agents do not call a langchain chat model they are given: Agent.post_init_setup rebuilds
+any non-crewai.LLM into a plain crewai.LLM (dropping its cache) and calls litellm through it.
+Agents given a CachedCrewLLM keep it as is, so crew calls are answered from LLMCache as well.
+"""
+from __future__ import annotations
+from typing import Any, Optional
+
+from crewai import LLM
+
+from backend.app.llm_cache import LLMCache, get_llm_cache, make_key
+
+
+class CachedCrewLLM(LLM):
+    def __init__(self, model: str, cache: Optional[LLMCache] = None, **kwargs: Any):
+        super().__init__(model=model, **kwargs)
+        self.cache = cache if cache is not None else get_llm_cache()
+
+    def call(self, messages, callbacks=[]):
+        if self.cache is None:
+            return super().call(messages, callbacks)
+        # crewai sets per-agent stop words on the LLM; they change the completion, so they are keyed too
+        key = make_key(self.model, {"messages": messages, "stop": self.stop}, self.temperature, self.max_tokens)
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        value = super().call(messages, callbacks)
+        if value:
+            self.cache.set(key, value)
+        return value
@@ -0,0 +1,148 @@
+from __future__ import annotations
+import os, json, time, sqlite3, hashlib, threading, contextvars
+from contextlib import contextmanager
+from typing import Any, Optional, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+load_dotenv()
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite3")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "7"))
+
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+@contextmanager
+def bypass_llm_cache():
+    """Skip the cache (no lookup, no store) for LLM calls made inside this block."""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def make_key(model: str, messages: Any, temperature: float, max_tokens: Optional[int]) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf8")).hexdigest()
+
+
+class LLMCache:
+    """Content-addressed LLM response cache in SQLite, shared by every process using the same file.
+
+    Entries older than max_age seconds are dropped, and the least recently used entries are
+    evicted once there are more than max_entries.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, max_age: float = 7 * 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        if _bypass.get():
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND created >= ?", (key, now - self.max_age)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        if _bypass.get():
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.max_age,))
+        self._conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+class LangChainLLMCache(BaseCache):
+    """Adapter so langchain chat models (ChatOpenAI(cache=...)) read and write the same LLMCache.
+
+    langchain's llm_string already encodes the model name, temperature and max_tokens.
+    """
+
+    def __init__(self, cache: LLMCache):
+        self.cache = cache
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"langchain\x00{llm_string}\x00{prompt}".encode("utf8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence]:
+        value = self.cache.get(self._key(prompt, llm_string))
+        if value is None:
+            return None
+        try:
+            return [loads(g) for g in json.loads(value)]
+        except Exception:
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence) -> None:
+        self.cache.set(self._key(prompt, llm_string), json.dumps([dumps(g) for g in return_val]))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.cache.clear()
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """The process-wide cache configured by LLM_CACHE_* (None when disabled)."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_AGE_DAYS * 86400)
+    return _cache
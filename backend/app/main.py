@@ -1,6 +1,8 @@
 from __future__ import annotations
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from pydantic import BaseModel
@@ -15,7 +17,15 @@ def _parse_origins(env_value: str | None) -> list[str]:
         return ["*"]
     return [o.strip() for o in env_value.split(",") if o.strip()]
 
-app = FastAPI(title="Qanoneed API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The FAISS store, indexes and CrewAI load in the background; /ready reports when they are done
+    from backend.app.services import startup
+    startup.start()
+    yield
+
+
+app = FastAPI(title="Qanoneed API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,6 +44,9 @@ app.include_router(chat_router, prefix="/api")
 
 from backend.app.roadmap.api_roadmap import router as roadmap_router
 app.include_router(roadmap_router)
+
+from backend.app.virtual.api_virtual import router as virtual_router
+app.include_router(virtual_router)
 # Health‑check ------------------------------------------------------
 
 @app.get("/health", tags=["meta"])
@@ -42,6 +55,31 @@ async def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/ready", tags=["meta"])
+async def ready() -> JSONResponse:
+    """Readiness probe: 503 until the vector store and models are loaded, with per-phase timings."""
+    from backend.app.services import startup
+    report = startup.report()
+    return JSONResponse(report, status_code=200 if report["status"] == "ready" else 503)
+
+
+@app.get("/admin/store", tags=["admin"])
+async def store_version() -> JSONResponse:
+    """The law store version being served, versions still draining and the one CURRENT points at."""
+    from backend.app import services
+    if services.law_store is None:
+        return JSONResponse({"status": "loading"}, status_code=503)
+    return JSONResponse(services.law_store.info())
+
+
+@app.get("/admin/llm-cache", tags=["admin"])
+async def llm_cache_stats() -> dict:
+    """Hits, misses and entries of the on-disk LLM cache shared by chat, crews and the virtual judge."""
+    from backend.app.llm_cache import get_llm_cache
+    cache = get_llm_cache()
+    return {"enabled": False} if cache is None else {"enabled": True, **cache.stats()}
+
+
 if __name__ == "__main__":
     import uvicorn 
 
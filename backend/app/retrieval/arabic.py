@@ -0,0 +1,23 @@
+from __future__ import annotations
+import re
+
+# Harakat, tanween, shadda, sukun, superscript alef and Quranic annotation marks
+_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+_TATWEEL = "\u0640"
+_ALEF_VARIANTS = re.compile(r"[\u0622\u0623\u0625\u0671]")  # آ أ إ ٱ
+_SPACES = re.compile(r"\s+")
+# Arabic-Indic (٠-٩) and Eastern Arabic-Indic (۰-۹) digits → Western digits
+_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+
+
+def normalize_arabic(text: str) -> str:
+    """Canonical form for matching Arabic text.
+
+    Strips diacritics and tatweel, folds alef variants to ا, ta marbuta to ه and alef maqsura to
+    ي, converts Arabic-Indic digits to Western ones, collapses whitespace and lower-cases any Latin.
+    """
+    text = _DIACRITICS.sub("", text).replace(_TATWEEL, "")
+    text = _ALEF_VARIANTS.sub("ا", text)
+    text = text.replace("ة", "ه").replace("ى", "ي")
+    text = text.translate(_DIGITS)
+    return _SPACES.sub(" ", text).strip().lower()
@@ -0,0 +1,207 @@
+"""Exact (law, article number) lookup for citation-style questions such as "ما نص المادة ٧٧ من نظام العمل".
+
+BOE article titles spell numbers out as ordinals ("المادة السابعة والسبعون", "المادة الحادية
+عشرة بعد المائة"), questions usually use digits in either system; both are reduced to an int.
+embeddings/build_faiss.py writes the index next to the FAISS store: the law table in
+articles.json and the article texts in articles.jsonl, which is memory-mapped so workers share it.
+"""
+from __future__ import annotations
+import os, re, json, mmap
+from typing import Iterable, Optional
+
+from langchain_core.documents import Document
+
+from backend.app.retrieval.arabic import normalize_arabic
+
+ARTICLES_FILE = "articles.json"
+ARTICLE_TEXTS_FILE = "articles.jsonl"
+
+# Ordinal words as normalize_arabic spells them (ة → ه, ى → ي, أ/إ → ا), masculine and feminine
+_UNITS = {
+    "الاول": 1, "الاولي": 1, "الحادي": 1, "الحاديه": 1, "الثاني": 2, "الثانيه": 2, "الثالث": 3, "الثالثه": 3,
+    "الرابع": 4, "الرابعه": 4, "الخامس": 5, "الخامسه": 5, "السادس": 6, "السادسه": 6, "السابع": 7, "السابعه": 7,
+    "الثامن": 8, "الثامنه": 8, "التاسع": 9, "التاسعه": 9,
+}
+_TENS = {
+    "العاشر": 10, "العاشره": 10, "عشر": 10, "عشره": 10, "العشرون": 20, "العشرين": 20, "الثلاثون": 30, "الثلاثين": 30,
+    "الاربعون": 40, "الاربعين": 40, "الخمسون": 50, "الخمسين": 50, "الستون": 60, "الستين": 60,
+    "السبعون": 70, "السبعين": 70, "الثمانون": 80, "الثمانين": 80, "التسعون": 90, "التسعين": 90,
+}
+_HUNDREDS = {
+    "المائه": 100, "الماءه": 100, "المئه": 100, "المائتين": 200, "المائتان": 200, "المئتين": 200,
+    "الثلاثمائه": 300, "الاربعمائه": 400, "الخمسمائه": 500, "الستمائه": 600,
+    "السبعمائه": 700, "الثمانمائه": 800, "التسعمائه": 900,
+}
+_ORDINAL_WORDS = set(_UNITS) | set(_TENS) | set(_HUNDREDS) | {"بعد"}
+_ORDINAL_WORDS |= {"و" + w for w in _UNITS.keys() | _TENS.keys() | _HUNDREDS.keys()}
+
+_ARTICLE_WORD = r"(?<!\w)(?:الماده|ماده|م\.?(?=\s*\d))"
+_CITATION = re.compile(rf"{_ARTICLE_WORD}\s*(?:رقم\s*)?\(?\s*(\d+|(?:\S+\s*){{1,6}})")
+# Words that only frame a request for the article's text; anything else makes it a real question
+_TEXT_REQUEST = {
+    "ما", "هو", "هي", "نص", "اعرض", "اذكر", "اعطني", "من", "في", "لي", "ماذا", "تنص", "تقول", "عن",
+    "الماده", "ماده", "رقم",
+}
+
+
+def ordinal_to_int(words: str) -> Optional[int]:
+    """Value of a (normalized) Arabic ordinal like "السابعه والسبعون بعد المائه"; None if it is not one."""
+    total, seen = 0, False
+    for word in words.split():
+        word = word[1:] if word.startswith("و") and word[1:] in _ORDINAL_WORDS else word
+        if word == "بعد":
+            continue
+        for table in (_UNITS, _TENS, _HUNDREDS):
+            if word in table:
+                total += table[word]
+                seen = True
+                break
+        else:
+            break   # the ordinal ended; the rest of the text is something else
+    return total if seen else None
+
+
+def parse_article_number(title: str) -> Optional[int]:
+    text = normalize_arabic(title)
+    match = re.search(r"\d+", text)
+    if match:
+        return int(match.group())
+    text = re.sub(rf"^{_ARTICLE_WORD}\s*", "", text)
+    return ordinal_to_int(text)
+
+
+def reference_key(question: str, law_names: Iterable[str] = ()) -> str:
+    """The law names and numbers (digits or ordinal article citations) a question mentions, as a
+    stable string: "ما نص المادة 77 من نظام العمل" → "نظام العمل|77".
+
+    Questions differing only in these embed almost identically, so semantically cached answers
+    are only shared between questions with the same key.
+    """
+    text = normalize_arabic(question)
+    numbers = set(re.findall(r"\d+", text))
+    for match in _CITATION.finditer(text):
+        number = ordinal_to_int(match.group(1))
+        if number is not None:
+            numbers.add(str(number))
+    laws = sorted(name for name in law_names if name in text)
+    return "|".join(laws + sorted(numbers, key=int))
+
+
+class ArticleIndex:
+    """(normalized law name, article number) → article text, amendments and BOE URL."""
+
+    def __init__(self, laws: dict, texts=None):
+        # normalized law name → {"law_id", "law_name", "url", "articles": {"77": [...]}}; with `texts`
+        # (the mapped articles.jsonl) each number holds the [start, end) byte range of its articles instead
+        self.laws = laws
+        self._texts = texts
+        # Longest names first so "نظام العمل التطوعي" wins over "نظام العمل"
+        self._names = sorted(laws, key=len, reverse=True)
+
+    @classmethod
+    def build(cls, laws: Iterable[dict]) -> "ArticleIndex":
+        index = {}
+        for law in laws:
+            entry = {"law_id": law["law_id"], "law_name": law["name"], "url": law["url"], "articles": {}}
+            for article in law.get("articles", []):
+                number = parse_article_number(article.get("title", ""))
+                if number is None or not article.get("content"):
+                    continue
+                entry["articles"].setdefault(str(number), []).append({
+                    "title": article.get("title", ""),
+                    "content": article["content"],
+                    "amendments": [
+                        {"text": a.get("text", ""), "url": a.get("source_url", law["url"])}
+                        for a in article.get("amendments") or [] if a.get("text")
+                    ],
+                })
+            index[normalize_arabic(law["name"])] = entry
+        return cls(index)
+
+    def _articles(self, law: dict, number: int) -> Optional[list]:
+        articles = law["articles"].get(str(number))
+        if articles is None or self._texts is None:
+            return articles
+        start, end = articles
+        return json.loads(self._texts[start:end])
+
+    def save(self, path: str) -> None:
+        """`path` (ARTICLES_FILE) gets the law table; the article texts go to ARTICLE_TEXTS_FILE next to it."""
+        table = {}
+        with open(os.path.join(os.path.dirname(path), ARTICLE_TEXTS_FILE), "wb") as f:
+            for name, law in self.laws.items():
+                ranges = {}
+                for number in law["articles"]:
+                    start = f.tell()
+                    f.write(json.dumps(self._articles(law, number), ensure_ascii=False).encode("utf8") + b"\n")
+                    ranges[number] = [start, f.tell()]
+                table[name] = {**law, "articles": ranges}
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(table, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "ArticleIndex":
+        with open(path, encoding="utf8") as f:
+            laws = json.load(f)
+        texts_path = os.path.join(os.path.dirname(path), ARTICLE_TEXTS_FILE)
+        if not os.path.exists(texts_path):
+            return cls(laws)   # older stores keep the texts inline in articles.json
+        with open(texts_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            return cls(laws, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b"")
+
+    def close(self) -> None:
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+
+    def reference_key(self, question: str) -> str:
+        return reference_key(question, self._names)
+
+    def lookup(self, question: str) -> Optional[dict]:
+        """The article a question cites, or None.
+
+        Returns {"law", "number", "articles", "direct"}; "direct" is True when the question only
+        asks for the article's text, so it can be answered from the index alone.
+        """
+        text = normalize_arabic(question)
+        law_name = next((name for name in self._names if name in text), None)
+        if law_name is None:
+            return None
+        match = _CITATION.search(text)
+        if not match:
+            return None
+        ref = match.group(1)
+        number = int(ref) if ref.isdigit() else ordinal_to_int(ref)
+        law = self.laws[law_name]
+        articles = self._articles(law, number) if number is not None else None
+        if not articles:
+            return None
+
+        rest = text.replace(law_name, " ")
+        rest = re.sub(rf"{_ARTICLE_WORD}\s*(?:رقم\s*)?\d+", " ", rest)
+        leftover = [w for w in re.findall(r"\w+", rest) if w not in _TEXT_REQUEST and w not in _ORDINAL_WORDS]
+        return {"law": law, "number": number, "articles": articles, "direct": not leftover}
+
+
+def article_documents(hit: dict) -> list[Document]:
+    """The looked-up article (and its amendments) as Documents shaped like the FAISS chunks."""
+    law = hit["law"]
+    docs = []
+    for article in hit["articles"]:
+        meta = {"law_id": law["law_id"], "law_name": law["law_name"], "article_title": article["title"], "url": law["url"]}
+        docs.append(Document(page_content=article["content"], metadata=meta))
+        for amendment in article["amendments"]:
+            docs.append(Document(page_content=amendment["text"], metadata={**meta, "url": amendment["url"], "is_amendment": True}))
+    return docs
+
+
+def format_article_answer(hit: dict) -> str:
+    law = hit["law"]
+    parts = []
+    for article in hit["articles"]:
+        parts.append(f"**{law['law_name']} — {article['title']}**\n\n{article['content']}")
+        for amendment in article["amendments"]:
+            source = f"\n\nالمصدر: {amendment['url']}" if amendment["url"] != law["url"] else ""
+            parts.append(f"**تعديل:**\n{amendment['text']}{source}")
+    parts.append(f"المصدر: {law['url']}")
+    return "\n\n".join(parts)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import os, re, json
+from collections import Counter, defaultdict
+from typing import Iterable, Optional
+
+import numpy as np
+
+from backend.app.retrieval.arabic import normalize_arabic
+
+# Stores built before the memory-mapped format have bm25.pkl instead and fall back to dense-only retrieval
+BM25_FILE = "bm25.json"
+
+_TOKEN = re.compile(r"\w+")
+# Light10-style affixes, in normalize_arabic's spelling (ة → ه, ى → ي); longest first
+_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+_SUFFIXES = ("ها", "ان", "ات", "ون", "ين", "يه", "ه", "ي")
+_STOPWORDS = {
+    "في", "من", "علي", "الي", "عن", "ان", "او", "ما", "لا", "هل", "هو", "هي", "هذا", "هذه",
+    "ذلك", "تلك", "التي", "الذي", "الذين", "كل", "قد", "ثم", "بعد", "قبل", "مع", "اذا", "كان",
+    "و", "ب", "ل", "به", "بها", "له", "لها", "فيه", "فيها", "منه", "منها", "عليه", "عليها",
+}
+
+
+def light_stem(token: str) -> str:
+    """Strip one common prefix and trailing suffixes while keeping at least a 2-letter stem."""
+    if token.isdigit():
+        return token
+    if token.startswith("و") and len(token) > 3:
+        token = token[1:]
+    for prefix in _PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            token = token[len(prefix):]
+            break
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            token = token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = _TOKEN.findall(normalize_arabic(text))
+    return [light_stem(t) for t in tokens if t not in _STOPWORDS]
+
+
+def _array_path(path: str, name: str) -> str:
+    return f"{os.path.splitext(path)[0]}.{name}.npy"
+
+
+class BM25Index:
+    """Okapi BM25 over stemmed, normalized Arabic tokens; search returns (doc id, score) pairs.
+
+    Postings are two flat arrays (document positions and term frequencies) sliced per term, so a
+    saved index is memory-mapped on load and shared by every worker through the page cache; only
+    the vocabulary and doc ids are held per process.
+    """
+
+    def __init__(self, ids: list[str], doc_len: np.ndarray, terms: dict, positions: np.ndarray, tfs: np.ndarray,
+                 k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.doc_len = doc_len
+        self.terms = terms           # term → (start, end) into positions / tfs
+        self.positions = positions
+        self.tfs = tfs
+        self.k1 = k1
+        self.b = b
+        self.avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    @classmethod
+    def build(cls, docs: Iterable[tuple[str, str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        ids, lengths = [], []
+        postings = defaultdict(lambda: ([], []))
+        for pos, (doc_id, text) in enumerate(docs):
+            counts = Counter(tokenize(text))
+            ids.append(doc_id)
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term][0].append(pos)
+                postings[term][1].append(tf)
+        terms, positions, tfs = {}, [], []
+        for term, (term_positions, term_tfs) in postings.items():
+            terms[term] = (len(positions), len(positions) + len(term_positions))
+            positions += term_positions
+            tfs += term_tfs
+        return cls(ids, np.asarray(lengths, dtype=np.float32), terms,
+                   np.asarray(positions, dtype=np.int32), np.asarray(tfs, dtype=np.float32), k1, b)
+
+    def search(self, query: str, k: int = 20, mask: Optional[np.ndarray] = None) -> list[tuple[str, float]]:
+        """Top-k documents for `query`; `mask` (one bool per document) restricts the candidates."""
+        n = len(self.ids)
+        if not n:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / (self.avgdl or 1.0))
+        for term in set(tokenize(query)):
+            if term not in self.terms:
+                continue
+            start, end = self.terms[term]
+            positions, tfs = self.positions[start:end], self.tfs[start:end]
+            idf = np.log(1 + (n - len(positions) + 0.5) / (len(positions) + 0.5))
+            scores[positions] += idf * tfs * (self.k1 + 1) / (tfs + norm[positions])
+
+        if mask is not None:
+            scores[~mask] = 0.0
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self, path: str) -> None:
+        """`path` (BM25_FILE) gets the vocabulary and ids; the arrays go to .npy files next to it."""
+        np.save(_array_path(path, "doc_len"), self.doc_len)
+        np.save(_array_path(path, "positions"), self.positions)
+        np.save(_array_path(path, "tfs"), self.tfs)
+        with open(path, "w", encoding="utf8") as f:
+            json.dump({"ids": self.ids, "terms": self.terms, "k1": self.k1, "b": self.b}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, encoding="utf8") as f:
+            data = json.load(f)
+        arrays = {name: np.load(_array_path(path, name), mmap_mode="r") for name in ("doc_len", "positions", "tfs")}
+        return cls(data["ids"], arrays["doc_len"], {t: tuple(r) for t, r in data["terms"].items()},
+                   arrays["positions"], arrays["tfs"], data["k1"], data["b"])
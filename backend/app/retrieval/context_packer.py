@@ -0,0 +1,137 @@
+"""Turn raw FAISS hits into a compact, diverse prompt context.
+
+build_faiss.py splits articles into 1000-char chunks with a 200-char overlap, so neighbouring hits
+often repeat the same text. pack_scored merges overlapping chunks of the same article, drops
+near-duplicates, orders what is left with MMR (relevance vs. overlap with what was already picked)
+and stops at a token budget. format_context renders the result with the law name, article title
+and URL kept on every item.
+"""
+from __future__ import annotations
+from typing import Iterable, Optional
+
+from langchain_core.documents import Document
+
+from backend.app.retrieval.arabic import normalize_arabic
+from backend.app.tokens import count_tokens
+
+# Longest overlap worth searching for: the splitter's CHUNK_OVERLAP plus slack for whitespace trimming
+_MAX_OVERLAP = 400
+_MIN_OVERLAP = 20
+
+
+def distance_to_similarity(distance: float) -> float:
+    # FAISS returns squared L2; for the unit-length OpenAI embeddings cosine = 1 - d² / 2
+    return 1.0 - float(distance) / 2.0
+
+
+def _article_key(doc: Document) -> tuple:
+    meta = doc.metadata
+    return (meta.get("law_id"), meta.get("article_title"), bool(meta.get("is_amendment")), meta.get("url"))
+
+
+def _join_overlap(a: str, b: str) -> Optional[str]:
+    """a and b stitched together if one contains the other or a's tail repeats b's head."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    for n in range(min(len(a), len(b), _MAX_OVERLAP), _MIN_OVERLAP - 1, -1):
+        if a.endswith(b[:n]):
+            return a + b[n:]
+    return None
+
+
+def _merge_group(hits: list[tuple[Document, float]]) -> list[tuple[Document, float]]:
+    # Greedily stitch chunks of one article; a merged item keeps the best similarity of its parts
+    items = [(doc.page_content, sim, doc.metadata) for doc, sim in hits]
+    merged = True
+    while merged and len(items) > 1:
+        merged = False
+        for i in range(len(items)):
+            for j in range(len(items)):
+                if i == j:
+                    continue
+                joined = _join_overlap(items[i][0], items[j][0])
+                if joined is not None:
+                    best = items[i] if items[i][1] >= items[j][1] else items[j]
+                    items[i] = (joined, best[1], best[2])
+                    del items[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [(Document(page_content=text, metadata=dict(meta)), sim) for text, sim, meta in items]
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = normalize_arabic(text).split()
+    if len(words) < n:
+        return {tuple(words)}
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _overlap(a: set, b: set) -> float:
+    # Overlap coefficient: a short chunk fully repeated inside a longer one scores 1
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def format_item(i: int, doc: Document) -> str:
+    meta = doc.metadata
+    header = f"[{i}] {meta.get('law_name', '')} — {meta.get('article_title', '')}"
+    if meta.get("is_amendment"):
+        header += " (تعديل)"
+    return f"{header}\nURL: {meta.get('url', '')}\n{doc.page_content}"
+
+
+def format_context(docs: Iterable[Document]) -> str:
+    return "\n\n".join(format_item(i, doc) for i, doc in enumerate(docs, 1))
+
+
+def pack_scored(
+    scored: list[tuple[Document, float]],
+    token_budget: int = 6000,
+    mmr_lambda: float = 0.7,
+    dedup_threshold: float = 0.8,
+) -> list[Document]:
+    """Select and merge retrieved chunks into at most `token_budget` tokens of formatted context.
+
+    `scored` are (Document, relevance in [0, 1]) pairs, e.g. fused hybrid scores or FAISS
+    distances mapped through distance_to_similarity. Returns the packed documents in the order
+    they should appear, each with its relevance in metadata["score"].
+    """
+    groups: dict[tuple, list[tuple[Document, float]]] = {}
+    for doc, sim in scored:
+        groups.setdefault(_article_key(doc), []).append((doc, sim))
+    candidates = [item for group in groups.values() for item in _merge_group(group)]
+    candidates.sort(key=lambda item: -item[1])
+
+    # Near-duplicates (e.g. an amendment repeating the article) keep only the more relevant copy
+    unique = []
+    for doc, sim in candidates:
+        shingles = _shingles(doc.page_content)
+        if all(_overlap(shingles, kept) < dedup_threshold for _, _, kept in unique):
+            unique.append((doc, sim, shingles))
+
+    selected: list[Document] = []
+    selected_shingles: list[set] = []
+    used_tokens = 0
+    remaining = unique
+    while remaining:
+        def mmr(item):
+            _, sim, shingles = item
+            redundancy = max((_overlap(shingles, s) for s in selected_shingles), default=0.0)
+            return mmr_lambda * sim - (1 - mmr_lambda) * redundancy
+
+        best = max(remaining, key=mmr)
+        remaining = [item for item in remaining if item is not best]
+        doc, sim, shingles = best
+        tokens = count_tokens(format_item(len(selected) + 1, doc)) + 2
+        if used_tokens + tokens > token_budget:
+            continue   # a smaller item further down may still fit
+        doc.metadata["score"] = round(sim, 4)
+        selected.append(doc)
+        selected_shingles.append(shingles)
+        used_tokens += tokens
+    return selected
@@ -0,0 +1,39 @@
+from __future__ import annotations
+import time, threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache of query embeddings whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_size: int = 2048, ttl: float = 86400):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[list[float]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, vector: Sequence[float]) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, list(vector))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._data)}
@@ -0,0 +1,87 @@
+"""Loading the law store with the index embeddings/build_faiss.py chose for it.
+
+The builder always keeps the exact langchain store (index.faiss + index.pkl), which it updates
+incrementally. With --index hnsw/ivf/ivfpq/sq8/... it also writes a compact approximate copy of
+the index and describes it in index_config.json; load_store then pairs that index with the
+pickled docstore, so the exact float32 vectors are never loaded by the API.
+
+With mmap=True (FAISS_MMAP) the index is opened with faiss' mmap/read-only IO flags and the
+docstore comes from the memory-mappable files in mmap_docstore.py, so several uvicorn workers
+share one copy through the page cache instead of each holding its own. The BM25 postings and the
+article texts (bm25.py, article_index.py) are mapped the same way; what stays per worker is the
+id lists, the BM25 vocabulary, the article-number table and the filter arrays.
+"""
+from __future__ import annotations
+import os, json, pickle
+from typing import Optional
+
+from langchain_community.vectorstores import FAISS
+
+from backend.app.retrieval.mmap_docstore import load_mmap_docstore
+
+INDEX_CONFIG_FILE = "index_config.json"
+
+
+def read_index_config(path: str) -> Optional[dict]:
+    config_path = os.path.join(path, INDEX_CONFIG_FILE)
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path, encoding="utf8") as f:
+        return json.load(f)
+
+
+def apply_search_params(index, params: dict) -> None:
+    """Set query-time knobs such as nprobe (IVF) or efSearch (HNSW); zero/None values are skipped."""
+    import faiss
+
+    space = faiss.ParameterSpace()
+    for name, value in params.items():
+        if value:
+            space.set_index_parameter(index, name, value)
+
+
+def read_faiss_index(path: str, mmap: bool = True):
+    """faiss.read_index, memory-mapped and read-only when the faiss build and index type allow it."""
+    import faiss
+
+    if mmap:
+        # IO_FLAG_MMAP maps IVF lists; IO_FLAG_MMAP_IFC (faiss >= 1.10) also maps flat/SQ/PQ codes
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+            flags |= faiss.IO_FLAG_MMAP_IFC
+        else:
+            print(f"⚠️ faiss {faiss.__version__} has no IO_FLAG_MMAP_IFC; flat/SQ/PQ codes of "
+                  f"{os.path.basename(path)} are read into each worker's memory (needs faiss-cpu >= 1.10)")
+        try:
+            return faiss.read_index(path, flags)
+        except RuntimeError as e:
+            print(f"⚠️ {os.path.basename(path)} cannot be memory-mapped ({e}); reading it into memory")
+    return faiss.read_index(path)
+
+
+def load_store(path: str, embeddings, search_params: Optional[dict] = None, mmap: bool = True) -> FAISS:
+    docs = load_mmap_docstore(path) if mmap else None
+    if docs is None:
+        if mmap:
+            print(f"⚠️ {path} has no mmap docstore; unpickling index.pkl (rebuild with build_faiss.py to add it)")
+        with open(os.path.join(path, "index.pkl"), "rb") as f:
+            docs = pickle.load(f)
+    docstore, index_to_docstore_id = docs
+
+    config = read_index_config(path)
+    if config and config.get("kind", "flat") != "flat" and config.get("ntotal") != len(index_to_docstore_id):
+        # The exact store was updated after the compact index was written; it no longer lines up
+        print(f"⚠️ {config['file']} is stale ({config.get('ntotal')} vs {len(index_to_docstore_id)} vectors); using the exact index")
+        config = None
+    if not config or config.get("kind", "flat") == "flat":
+        index = read_faiss_index(os.path.join(path, "index.faiss"), mmap)
+    else:
+        index = read_faiss_index(os.path.join(path, config["file"]), mmap)
+        # Overrides only apply to the knobs this index type has (nprobe for IVF, efSearch for HNSW)
+        params = dict(config.get("search_params", {}))
+        params.update({k: v for k, v in (search_params or {}).items() if v and k in params})
+        apply_search_params(index, params)
+
+    if index.ntotal != len(index_to_docstore_id):
+        raise ValueError(f"❌ {path}: index has {index.ntotal} vectors but the docstore has {len(index_to_docstore_id)}")
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
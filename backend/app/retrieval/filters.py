@@ -0,0 +1,141 @@
+"""Metadata filters for retrieval: restrict a search to some laws or a law category and/or leave
+out amendment text.
+
+FilterIndex reads law_id / is_amendment for every vector once at startup. A filter becomes a
+FAISS IDSelector over index positions (so the index itself only scores allowed vectors) and a
+boolean mask over the BM25 documents. Categories come from the law catalog (laws.json) that
+embeddings/build_faiss.py writes from the "# category:" sections of data/legal_sources.txt.
+"""
+from __future__ import annotations
+import os, json
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import numpy as np
+
+LAW_CATALOG_FILE = "laws.json"
+
+
+class UnknownFilterError(ValueError):
+    """A filter names a category or law the store does not have, so it could only match nothing."""
+
+
+@dataclass(frozen=True)
+class RetrievalFilter:
+    law_ids: tuple[str, ...] = ()
+    category: Optional[str] = None
+    exclude_amendments: bool = False
+
+    @classmethod
+    def of(cls, law_ids: Optional[Sequence[str]] = None, category: Optional[str] = None,
+           exclude_amendments: bool = False) -> Optional["RetrievalFilter"]:
+        """A filter, or None when nothing is restricted."""
+        f = cls(tuple(sorted(law_ids or ())), category or None, bool(exclude_amendments))
+        return None if f == cls() else f
+
+    def key(self) -> str:
+        """Stable text form, used to keep cached answers for different filters apart."""
+        return json.dumps([self.law_ids, self.category, self.exclude_amendments], ensure_ascii=False)
+
+
+def load_law_catalog(path: str) -> dict:
+    catalog_path = os.path.join(path, LAW_CATALOG_FILE)
+    if not os.path.exists(catalog_path):
+        return {}
+    with open(catalog_path, encoding="utf8") as f:
+        return json.load(f)
+
+
+def _search_parameters(index, selector):
+    import faiss
+
+    # IVF and HNSW indexes reject plain SearchParameters; carry their current depth over
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = index.hnsw.efSearch
+    else:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            params = faiss.SearchParametersIVF()
+            params.nprobe = ivf.nprobe
+        else:
+            params = faiss.SearchParameters()
+    params.sel = selector
+    return params
+
+
+class FilterIndex:
+    def __init__(self, store, catalog: dict, bm25_ids: Sequence[str] = ()):
+        self.catalog = catalog
+        law_codes: dict = {}
+        positions_by_id = {}
+        n = store.index.ntotal
+        self._law = np.full(n, -1, dtype=np.int32)
+        self._amendment = np.zeros(n, dtype=bool)
+        for pos, doc_id in store.index_to_docstore_id.items():
+            doc = store.docstore.search(doc_id)
+            if isinstance(doc, str):
+                continue
+            self._law[pos] = law_codes.setdefault(doc.metadata.get("law_id"), len(law_codes))
+            self._amendment[pos] = bool(doc.metadata.get("is_amendment"))
+            positions_by_id[doc_id] = pos
+        self._law_codes = law_codes
+        # BM25 documents share the docstore ids; map them onto index positions once
+        self._bm25_positions = np.asarray([positions_by_id.get(doc_id, -1) for doc_id in bm25_ids], dtype=np.int64)
+
+    def categories(self) -> set:
+        """Categories that at least one law in the store belongs to."""
+        return {info.get("category") for law_id, info in self.catalog.items()
+                if info.get("category") and law_id in self._law_codes}
+
+    def validate(self, f: RetrievalFilter) -> None:
+        """Raise UnknownFilterError rather than let a filter silently leave retrieval empty."""
+        if f.category and f.category not in self.categories():
+            known = ", ".join(sorted(self.categories())) or "none (data/legal_sources.txt has no '# category:' lines)"
+            raise UnknownFilterError(f"Unknown law category {f.category!r}; known categories: {known}")
+        unknown = [law_id for law_id in f.law_ids if law_id not in self._law_codes]
+        if unknown:
+            raise UnknownFilterError(f"Unknown law ids: {', '.join(unknown)}")
+
+    def law_ids(self, f: RetrievalFilter) -> Optional[set]:
+        """The laws a filter allows (None = all)."""
+        laws = set(f.law_ids) if f.law_ids else None
+        if f.category:
+            in_category = {law_id for law_id, info in self.catalog.items() if info.get("category") == f.category}
+            laws = in_category if laws is None else laws & in_category
+        return laws
+
+    def allowed(self, f: RetrievalFilter) -> np.ndarray:
+        """Boolean mask over index positions."""
+        mask = np.ones(len(self._law), dtype=bool)
+        laws = self.law_ids(f)
+        if laws is not None:
+            codes = [self._law_codes[law_id] for law_id in laws if law_id in self._law_codes]
+            mask &= np.isin(self._law, codes)
+        if f.exclude_amendments:
+            mask &= ~self._amendment
+        return mask
+
+    def search(self, store, vector: Sequence[float], k: int, f: RetrievalFilter) -> list[tuple[str, float]]:
+        """Like hybrid.dense_search, but only over the vectors the filter allows."""
+        import faiss
+
+        positions = np.flatnonzero(self.allowed(f)).astype(np.int64)
+        if not len(positions):
+            return []
+        selector = faiss.IDSelectorBatch(len(positions), faiss.swig_ptr(positions))
+        query = np.asarray([vector], dtype=np.float32)
+        if getattr(store, "_normalize_L2", False):
+            faiss.normalize_L2(query)
+        distances, found = store.index.search(query, min(k, len(positions)), params=_search_parameters(store.index, selector))
+        return [
+            (store.index_to_docstore_id[int(pos)], float(dist))
+            for dist, pos in zip(distances[0], found[0]) if pos != -1
+        ]
+
+    def bm25_mask(self, f: RetrievalFilter) -> np.ndarray:
+        allowed = self.allowed(f)
+        valid = self._bm25_positions >= 0
+        mask = np.zeros(len(self._bm25_positions), dtype=bool)
+        mask[valid] = allowed[self._bm25_positions[valid]]
+        return mask
@@ -0,0 +1,32 @@
+from __future__ import annotations
+from typing import Sequence
+
+import numpy as np
+
+
+def dense_search(store, vector: Sequence[float], k: int) -> list[tuple[str, float]]:
+    """Top-k (docstore id, squared L2 distance) pairs straight from a langchain FAISS store's index."""
+    import faiss
+
+    query = np.asarray([vector], dtype=np.float32)
+    if getattr(store, "_normalize_L2", False):
+        faiss.normalize_L2(query)
+    distances, positions = store.index.search(query, k)
+    return [
+        (store.index_to_docstore_id[int(pos)], float(dist))
+        for dist, pos in zip(distances[0], positions[0]) if pos != -1
+    ]
+
+
+def rrf_fuse(rankings: Sequence[Sequence[str]], weights: Sequence[float], rrf_k: int = 60) -> list[tuple[str, float]]:
+    """Weighted reciprocal-rank fusion: score(d) = Σ weight / (rrf_k + rank of d), ranks from 1.
+
+    Returns (id, score) pairs, best first, with scores divided by the best achievable score so
+    they fall in [0, 1].
+    """
+    scores: dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (rrf_k + rank)
+    best = sum(w for w in weights if w > 0) / (rrf_k + 1) or 1.0
+    return sorted(((doc_id, score / best) for doc_id, score in scores.items()), key=lambda item: -item[1])
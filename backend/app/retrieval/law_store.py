@@ -0,0 +1,171 @@
+"""The loaded law store, swapped without downtime when a new version is published.
+
+LawStore bundles everything retrieval reads from one store directory (FAISS store, BM25,
+article and filter indexes) and counts the requests using it. HotSwapStore polls CURRENT (see
+store_versions.py); when it points at a new version, that version is loaded on the watcher
+thread while requests keep using the old one, then swapped in under a lock. The old store is
+closed once its in-flight requests have drained.
+"""
+from __future__ import annotations
+import os, time, threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from backend.app.retrieval.article_index import ArticleIndex, ARTICLES_FILE
+from backend.app.retrieval.bm25 import BM25Index, BM25_FILE
+from backend.app.retrieval.faiss_store import load_store
+from backend.app.retrieval.filters import FilterIndex, load_law_catalog
+from backend.app.retrieval.store_versions import current_version, resolve_store_path
+
+
+class LawStore:
+    def __init__(self, path: str, version: Optional[str], vector_db, bm25_index: Optional[BM25Index],
+                 article_index: Optional[ArticleIndex], filter_index: FilterIndex):
+        self.path = path
+        self.version = version
+        self.vector_db = vector_db
+        self.bm25_index = bm25_index
+        self.article_index = article_index
+        self.filter_index = filter_index
+        self.loaded_at = time.time()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+
+    @classmethod
+    def load(cls, path: str, version: Optional[str], embeddings, search_params: Optional[dict] = None,
+             mmap: bool = True) -> "LawStore":
+        started = time.perf_counter()
+        vector_db = load_store(path, embeddings, search_params=search_params, mmap=mmap)
+        loaded = time.perf_counter()
+        # Built next to the store by embeddings/build_faiss.py; stores built before it get dense-only retrieval
+        bm25_path = os.path.join(path, BM25_FILE)
+        bm25_index = BM25Index.load(bm25_path) if os.path.exists(bm25_path) else None
+        articles_path = os.path.join(path, ARTICLES_FILE)
+        article_index = ArticleIndex.load(articles_path) if os.path.exists(articles_path) else None
+        filter_index = FilterIndex(vector_db, load_law_catalog(path), bm25_index.ids if bm25_index else ())
+        finished = time.perf_counter()
+        print(f"📚 Store {version or path}: {vector_db.index.ntotal} vectors; FAISS {(loaded - started) * 1000:.0f}ms, "
+              f"BM25/articles/filters {(finished - loaded) * 1000:.0f}ms")
+        return cls(path, version, vector_db, bm25_index, article_index, filter_index)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def enter(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+            self._idle.clear()
+
+    def exit(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._idle.set()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait for in-flight requests to finish; False if some were still running after `timeout`."""
+        return self._idle.wait(timeout)
+
+    def close(self) -> None:
+        for resource in (self.vector_db.docstore, self.article_index):
+            close = getattr(resource, "close", None)
+            if close is not None:
+                close()
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "vectors": self.vector_db.index.ntotal,
+            "loaded_at": self.loaded_at,
+            "in_flight": self._in_flight,
+        }
+
+
+class HotSwapStore:
+    def __init__(self, root: str, load: Callable[[str, Optional[str]], LawStore],
+                 poll_interval: float = 30.0, drain_timeout: float = 300.0):
+        self.root = root
+        self._load = load
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.current: Optional[LawStore] = None
+        self.draining: list[LawStore] = []
+        self.last_error: Optional[str] = None
+        self._failed_version: Optional[str] = None
+        self._lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+
+    def load_initial(self) -> None:
+        path, version = resolve_store_path(self.root)
+        self.current = self._load(path, version)
+
+    @contextmanager
+    def acquire(self) -> Iterator[LawStore]:
+        """The current store, kept open (not closed by a swap) until the block exits."""
+        with self._lock:
+            store = self.current
+            store.enter()
+        try:
+            yield store
+        finally:
+            store.exit()
+
+    def check(self) -> bool:
+        """Load and swap in the version CURRENT points at, if it changed; True when a swap happened."""
+        with self._swap_lock:
+            version = current_version(self.root)
+            if version is None or version == self._failed_version or (self.current is not None and version == self.current.version):
+                return False
+            path, version = resolve_store_path(self.root)
+            print(f"🔄 New store version {version}; loading it in the background")
+            try:
+                new = self._load(path, version)
+            except Exception:
+                self._failed_version = version   # not retried until another version is published
+                raise
+            with self._lock:
+                old, self.current = self.current, new
+            print(f"✅ Now serving store version {version}")
+            if old is not None:
+                self.draining.append(old)
+                threading.Thread(target=self._retire, args=(old,), name="store-drain", daemon=True).start()
+            return True
+
+    def _retire(self, store: LawStore) -> None:
+        if not store.drain(self.drain_timeout):
+            print(f"⚠️ {store.in_flight} requests still on store version {store.version} after {self.drain_timeout}s; closing it anyway")
+        store.close()
+        self.draining.remove(store)
+        print(f"🧹 Store version {store.version or store.path} drained and closed")
+
+    def start_watching(self) -> None:
+        if self.poll_interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="store-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                if self.check():
+                    self.last_error = None
+            except Exception as e:
+                # Keep serving the old version
+                self.last_error = str(e)
+                print(f"❌ Loading the new store version failed: {e}")
+
+    def info(self) -> dict:
+        return {
+            "root": self.root,
+            "current": self.current.info() if self.current is not None else None,
+            "draining": [store.info() for store in self.draining],
+            "published_version": current_version(self.root),
+            "poll_interval": self.poll_interval,
+            "last_error": self.last_error,
+        }
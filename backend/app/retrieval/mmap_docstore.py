@@ -0,0 +1,79 @@
+"""Read-only docstore that uvicorn workers memory-map instead of unpickling.
+
+embeddings/build_faiss.py writes three files next to index.pkl:
+
+* docstore.jsonl        – one JSON record ({"page_content", "metadata"}) per vector, in index position order
+* docstore.offsets.npy  – int64 byte offsets of the records (n + 1 entries)
+* docstore.ids.json     – the docstore id of each position
+
+The record bytes stay in the page cache and are shared by every worker; a worker only keeps
+the ids and decodes a record when a search returns it.
+"""
+from __future__ import annotations
+import os, json, mmap
+from typing import Optional, Union
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+DOCSTORE_FILE = "docstore.jsonl"
+DOCSTORE_OFFSETS_FILE = "docstore.offsets.npy"
+DOCSTORE_IDS_FILE = "docstore.ids.json"
+
+
+def write_mmap_docstore(path: str, store) -> None:
+    """Dump a langchain FAISS store's docstore in index position order."""
+    ids = [store.index_to_docstore_id[pos] for pos in range(len(store.index_to_docstore_id))]
+    offsets = [0]
+    with open(os.path.join(path, DOCSTORE_FILE + ".tmp"), "wb") as f:
+        for doc_id in ids:
+            doc = store.docstore.search(doc_id)
+            record = {"page_content": doc.page_content, "metadata": doc.metadata} if not isinstance(doc, str) else None
+            f.write(json.dumps(record, ensure_ascii=False).encode("utf8") + b"\n")
+            offsets.append(f.tell())
+    np.save(os.path.join(path, DOCSTORE_OFFSETS_FILE + ".tmp.npy"), np.asarray(offsets, dtype=np.int64))
+    with open(os.path.join(path, DOCSTORE_IDS_FILE + ".tmp"), "w", encoding="utf8") as f:
+        json.dump(ids, f)
+
+    os.replace(os.path.join(path, DOCSTORE_FILE + ".tmp"), os.path.join(path, DOCSTORE_FILE))
+    os.replace(os.path.join(path, DOCSTORE_OFFSETS_FILE + ".tmp.npy"), os.path.join(path, DOCSTORE_OFFSETS_FILE))
+    os.replace(os.path.join(path, DOCSTORE_IDS_FILE + ".tmp"), os.path.join(path, DOCSTORE_IDS_FILE))
+
+
+class MmapDocstore(Docstore):
+    def __init__(self, path: str):
+        self._offsets = np.load(os.path.join(path, DOCSTORE_OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(path, DOCSTORE_IDS_FILE), encoding="utf8") as f:
+            self.ids = json.load(f)
+        self._positions = {doc_id: pos for pos, doc_id in enumerate(self.ids)}
+        with open(os.path.join(path, DOCSTORE_FILE), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, search: str) -> Union[str, Document]:
+        pos = self._positions.get(search)
+        if pos is None:
+            return f"ID {search} not found."   # what InMemoryDocstore returns
+        record = json.loads(self._data[int(self._offsets[pos]):int(self._offsets[pos + 1])])
+        if record is None:
+            return f"ID {search} not found."
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+
+def load_mmap_docstore(path: str) -> Optional[tuple[MmapDocstore, dict]]:
+    """(docstore, index_to_docstore_id), or None when the store has no (complete) mmap docstore."""
+    if not all(os.path.exists(os.path.join(path, name)) for name in (DOCSTORE_FILE, DOCSTORE_OFFSETS_FILE, DOCSTORE_IDS_FILE)):
+        return None
+    docstore = MmapDocstore(path)
+    if len(docstore._offsets) != len(docstore.ids) + 1:
+        print(f"⚠️ {DOCSTORE_IDS_FILE} does not match {DOCSTORE_OFFSETS_FILE}; using index.pkl")
+        return None
+    return docstore, dict(enumerate(docstore.ids))
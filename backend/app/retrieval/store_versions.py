@@ -0,0 +1,70 @@
+"""Versioned layout of VECTOR_STORE_PATH.
+
+    law_vector_store/
+        CURRENT                  ← name of the live version, replaced atomically
+        versions/20250101T120000/index.faiss, index.pkl, bm25.json, ...
+        versions/20250108T120000/...
+
+embeddings/build_faiss.py stages every rebuild in a new version directory and only then points
+CURRENT at it, so the API never reads a half-written store; services.py notices the new
+CURRENT and swaps the store in without a restart. A directory with index.faiss directly in it
+(stores built before versioning) is still served as-is until the next build, which moves it into
+a version and removes the top-level files.
+"""
+from __future__ import annotations
+import os, time, shutil
+from typing import Optional
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+
+def current_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_path(root: str, version: str) -> str:
+    return os.path.join(root, VERSIONS_DIR, version)
+
+
+def resolve_store_path(root: str) -> tuple[str, Optional[str]]:
+    """(directory to load, version); version is None for an unversioned store."""
+    version = current_version(root)
+    return (version_path(root, version), version) if version else (root, None)
+
+
+def new_version(root: str) -> str:
+    """A fresh, sortable version name; its directory is not created."""
+    version = time.strftime("%Y%m%dT%H%M%S")
+    suffix = 1
+    while os.path.exists(version_path(root, version if suffix == 1 else f"{version}-{suffix}")):
+        suffix += 1
+    return version if suffix == 1 else f"{version}-{suffix}"
+
+
+def publish_version(root: str, version: str) -> None:
+    """Point CURRENT at `version` with an atomic rename."""
+    tmp = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+
+def prune_versions(root: str, keep: int) -> list[str]:
+    """Delete all but the newest `keep` versions (never the current one); returns the deleted names."""
+    versions_root = os.path.join(root, VERSIONS_DIR)
+    if keep <= 0 or not os.path.isdir(versions_root):
+        return []
+    current = current_version(root)
+    versions = sorted(os.listdir(versions_root), reverse=True)
+    removed = [v for v in versions[keep:] if v != current]
+    for version in removed:
+        # Workers still draining requests on an old version keep its open/mmapped files alive
+        shutil.rmtree(version_path(root, version), ignore_errors=True)
+    return removed
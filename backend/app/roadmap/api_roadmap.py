@@ -1,16 +1,29 @@
-from fastapi import APIRouter, Request
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from backend.app.services import run_roadmap   
+from backend.app.services import run_roadmap, check_filters
+from backend.app.retrieval.filters import RetrievalFilter, UnknownFilterError
 
 router = APIRouter(prefix="/api", tags=["roadmap"])
 
 class RoadmapRequest(BaseModel):
     question: str
+    # Optional retrieval filters (see ChatRequest); an unknown category or law id is a 400
+    law_ids: Optional[List[str]] = None
+    category: Optional[str] = None
+    exclude_amendments: bool = False
 
 class ChatResponse(BaseModel):
     answer: str
+    cached: bool = False
+    timings: Dict[str, float] = {}
 
 @router.post("/roadmap", response_model=ChatResponse)
 async def roadmap_endpoint(req: RoadmapRequest, request: Request):
-    answer = await run_roadmap(req.question)
-    return {"answer": answer}
\ No newline at end of file
+    filters = RetrievalFilter.of(req.law_ids, req.category, req.exclude_amendments)
+    try:
+        await check_filters(filters)
+    except UnknownFilterError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return await run_roadmap(req.question, filters=filters)
\ No newline at end of file
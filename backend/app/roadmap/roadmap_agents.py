@@ -1,7 +1,9 @@
 from __future__ import annotations
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from crewai import Crew
 
-from crewai import Agent, Task, Crew
 
 RESEARCH_PROMPT = """أنت باحث مختص في الإجراءات القانونية السعودية.
 لديك سؤال المستخدم التالي:
@@ -59,6 +61,8 @@ REVIEW_PROMPT = """أنت مدير استشارات قانونية.
 """
 
 def _get_roadmap_agents(llm):
+    from crewai import Agent
+
     researcher = Agent(
         role="Procedure Researcher",
         goal="Extract relevant legal procedures, timelines, and authorities",
@@ -85,12 +89,13 @@ def _get_roadmap_agents(llm):
     return researcher, planner, reviewer
 
 
-def create_roadmap_crew(llm, question: str, context: str) -> Crew:
-   
+def create_roadmap_crew(llm, question: str, context: str, task_callback=None) -> Crew:
+    from crewai import Task, Crew
+
     researcher, planner, reviewer = _get_roadmap_agents(llm)
 
     research_task = Task(
-        description=RESEARCH_PROMPT.format(question=question, context=context[:4000]),
+        description=RESEARCH_PROMPT.format(question=question, context=context),
         expected_output="Markdown JSON list of extracted procedure hints",
         agent=researcher,
     )
@@ -114,4 +119,5 @@ def create_roadmap_crew(llm, question: str, context: str) -> Crew:
         tasks=[research_task, plan_task, review_task],
         verbose=True,
         memory=False,
+        task_callback=task_callback,
     )
@@ -1,78 +1,403 @@
 from __future__ import annotations
-import os, functools, asyncio
+import os, asyncio, time, functools, contextvars
 from concurrent.futures import ThreadPoolExecutor
 
 from backend.app.roadmap.roadmap_agents import create_roadmap_crew
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
 
-from backend.app.chatbot.tasks import create_crew        
+from backend.app.chatbot.tasks import create_crew
+from backend.app.chatbot.pipelines import (
+    PIPELINE_MODES, elapsed_ms, run_single_call, run_two_call,
+    single_call_messages, research_messages, writing_messages, review_messages,
+)
+from backend.app.llm_cache import get_llm_cache, LangChainLLMCache
+from backend.app.retrieval.arabic import normalize_arabic
+from backend.app.retrieval.embedding_cache import EmbeddingCache
+from backend.app.retrieval.context_packer import pack_scored, format_context, distance_to_similarity
+from backend.app.retrieval.hybrid import dense_search, rrf_fuse
+from backend.app.retrieval.filters import RetrievalFilter
+from backend.app.retrieval.article_index import article_documents, format_article_answer, reference_key
+from backend.app.answer_cache import SemanticAnswerCache, store_fingerprint
+from backend.app.startup import StartupLoader
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH")
+# Must match the model embeddings/build_faiss.py builds the store with
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "86400"))
+# Chat pipeline used when a request does not pick one: "single", "two_call" or "crew"
+CHAT_PIPELINE_MODE = os.getenv("CHAT_PIPELINE_MODE", "crew")
+CHAT_MODEL = "gpt-4o"
+# Answers are reused for questions whose embeddings are at least this cosine-similar
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+# Retrieved chunks are merged, de-duplicated and trimmed to this many prompt tokens
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_MIN_SIMILARITY = float(os.getenv("CONTEXT_MIN_SIMILARITY", "0.0"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+# Reciprocal-rank fusion of the FAISS and BM25 rankings (lexical weight 0 = dense only)
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Query-time overrides for an approximate index written by build_faiss.py --index (0 = its index_config.json)
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "0"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "0"))
+# Memory-map the index and docstore read-only so uvicorn workers share them through the page cache
+FAISS_MMAP = os.getenv("FAISS_MMAP", "1") == "1"
+# How often to look for a newly published store version (0 = never), and how long an old version
+# may keep serving in-flight requests before it is closed
+STORE_POLL_INTERVAL = float(os.getenv("STORE_POLL_INTERVAL", "30"))
+STORE_DRAIN_TIMEOUT = float(os.getenv("STORE_DRAIN_TIMEOUT", "300"))
+
+# Everything below is loaded by `startup` on a background thread (main.py starts it with the app);
+# request handlers await startup.wait_async() before touching them.
+llm = None
+embedding_model = None
+law_store = None   # HotSwapStore: the current LawStore, replaced when a new store version is published
+
+
+def _load_clients() -> None:
+    global llm, embedding_model
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+    # Identical prompts (re-submitted questions, crew retries) are answered from the on-disk LLM cache;
+    # wrap a call in llm_cache.bypass_llm_cache() to force a fresh completion (crews included: they
+    # run through _run_in_executor, which carries the caller's context into the worker thread).
+    llm_cache = get_llm_cache()
+    llm = ChatOpenAI(
+        model_name=CHAT_MODEL,
+        api_key=OPENAI_API_KEY,
+        temperature=0.0,
+        cache=LangChainLLMCache(llm_cache) if llm_cache is not None else None
+    )
+    embedding_model = OpenAIEmbeddings(model=EMBEDDING_MODEL, api_key=OPENAI_API_KEY)
+
+
+def _open_law_store(path: str, version: str | None):
+    from backend.app.retrieval.law_store import LawStore
+
+    return LawStore.load(
+        path, version, embedding_model,
+        search_params={"nprobe": FAISS_NPROBE, "efSearch": FAISS_EF_SEARCH},
+        mmap=FAISS_MMAP,
+    )
+
+
+def _load_law_store() -> None:
+    global law_store
+    from backend.app.retrieval.law_store import HotSwapStore
+
+    store = HotSwapStore(VECTOR_STORE_PATH, _open_law_store, STORE_POLL_INTERVAL, STORE_DRAIN_TIMEOUT)
+    store.load_initial()
+    store.start_watching()
+    law_store = store
+
+
+def _import_crewai() -> None:
+    # agents.py / tasks.py / roadmap_agents.py import CrewAI on first use; pay for it here instead
+    import crewai  # noqa: F401
+    import backend.app.crew_llm  # noqa: F401
+
+
+def _import_virtual_judge() -> None:
+    # api_virtual.py imports the virtual judge (OpenAI clients, case index) on first use; pay for it here instead
+    import backend.app.virtual.openSdk  # noqa: F401
 
-llm = ChatOpenAI( 
-    model_name="gpt-4o",
-    api_key=OPENAI_API_KEY,
-    temperature=0.0
-) 
-
-embedding_model = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
-vector_db = FAISS.load_local(
-    VECTOR_STORE_PATH,
-    embeddings=embedding_model,
-    allow_dangerous_deserialization=True
-)
+
+def _crew_llm():
+    """A fresh cached crewai.LLM per crew: crewai keeps per-agent state (stop words) on it, and it
+    would replace a langchain model such as `llm` with an uncached one."""
+    from backend.app.crew_llm import CachedCrewLLM
+
+    return CachedCrewLLM(model=CHAT_MODEL, temperature=0.0, api_key=OPENAI_API_KEY)
+
+
+startup = StartupLoader([
+    ("clients", _load_clients),
+    ("law_store", _load_law_store),
+    ("crewai", _import_crewai),
+    ("virtual_judge", _import_virtual_judge),
+])
 
 _executor = ThreadPoolExecutor(max_workers=4)
+_embedding_cache = EmbeddingCache(max_size=EMBED_CACHE_SIZE, ttl=EMBED_CACHE_TTL)
+_answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD, max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL
+)
 
 
 # --------------------------------------------------------
 
-async def run_chat(question: str, k: int = 20) -> str:
-    docs = vector_db.similarity_search(question, k=k)
-    crew = create_crew(llm, question, docs)
+def _run_in_executor(fn, *args):
+    """loop.run_in_executor on the shared pool, with the caller's contextvars (e.g. bypass_llm_cache())."""
+    ctx = contextvars.copy_context()
+    return asyncio.get_event_loop().run_in_executor(_executor, functools.partial(ctx.run, fn, *args))
 
 
-    loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(_executor, crew.kickoff)
+def embed_query(question: str) -> list[float]:
+    """Embedding of `question`, served from the LRU/TTL cache keyed on its normalized Arabic form."""
+    key = normalize_arabic(question)
+    vector = _embedding_cache.get(key)
+    if vector is None:
+        vector = embedding_model.embed_query(question)
+        _embedding_cache.put(key, vector)
+    return vector
+
+
+def lookup_article(store, question: str):
+    """The (law, article) a citation-style question refers to, from the exact article index."""
+    return store.article_index.lookup(question) if store.article_index is not None else None
+
+
+def _direct_article(store, question: str, filters: RetrievalFilter | None):
+    """A citation-style question that the article index can answer on its own, within the filters."""
+    hit = lookup_article(store, question)
+    if not hit or not hit["direct"]:
+        return None
+    if filters is not None:
+        laws = store.filter_index.law_ids(filters)
+        if laws is not None and hit["law"]["law_id"] not in laws:
+            return None
+        if filters.exclude_amendments:
+            hit = {**hit, "articles": [{**a, "amendments": []} for a in hit["articles"]]}
+    return hit
+
+
+def _dense(store, vector: list[float], k: int, filters: RetrievalFilter | None):
+    if filters is None:
+        return dense_search(store.vector_db, vector, k)
+    return store.filter_index.search(store.vector_db, vector, k, filters)
+
+
+def retrieve(store, question: str, vector: list[float], k: int, filters: RetrievalFilter | None = None):
+    """Top-k chunks for the question from `store` (a LawStore), packed into the CONTEXT_* token budget.
+
+    With a BM25 index, the FAISS and BM25 top-k are fused with weighted reciprocal-rank fusion;
+    CONTEXT_MIN_SIMILARITY only filters the dense candidates. An article the question cites by
+    number is pinned first, at full relevance. `filters` restricts every source to the allowed
+    laws / non-amendment text.
+    """
+    hit = lookup_article(store, question)
+    pinned = [(doc, 1.0) for doc in article_documents(hit)] if hit else []
+    if filters is not None:
+        laws = store.filter_index.law_ids(filters)
+        pinned = [
+            (doc, score) for doc, score in pinned
+            if (laws is None or doc.metadata["law_id"] in laws)
+            and not (filters.exclude_amendments and doc.metadata.get("is_amendment"))
+        ]
 
+    dense = [(doc_id, distance_to_similarity(d)) for doc_id, d in _dense(store, vector, k, filters)]
+    dense = [(doc_id, sim) for doc_id, sim in dense if sim >= CONTEXT_MIN_SIMILARITY]
+    if store.bm25_index is None or HYBRID_LEXICAL_WEIGHT <= 0:
+        ranked = dense
+    else:
+        mask = store.filter_index.bm25_mask(filters) if filters is not None else None
+        lexical = [doc_id for doc_id, _ in store.bm25_index.search(question, k, mask)]
+        ranked = rrf_fuse([[doc_id for doc_id, _ in dense], lexical], [HYBRID_DENSE_WEIGHT, HYBRID_LEXICAL_WEIGHT], HYBRID_RRF_K)[:k]
+
+    scored = [(store.vector_db.docstore.search(doc_id), score) for doc_id, score in ranked]
+    return pack_scored(
+        pinned + [(doc, score) for doc, score in scored if not isinstance(doc, str)],   # str = id missing from the docstore
+        token_budget=CONTEXT_TOKEN_BUDGET,
+        mmr_lambda=CONTEXT_MMR_LAMBDA,
+        dedup_threshold=CONTEXT_DEDUP_THRESHOLD,
+    )
+
+
+async def check_filters(filters: RetrievalFilter | None) -> None:
+    """Raise filters.UnknownFilterError when `filters` names a category or law the current store lacks."""
+    if filters is None:
+        return
+    await startup.wait_async()
+    with law_store.acquire() as store:
+        store.filter_index.validate(filters)
+
+
+def _crew_output(result) -> str:
     if isinstance(result, str):
         return result
-    if hasattr(result, "raw"):
-        return result.raw                      
+    if hasattr(result, "raw"):              # CrewOutput
+        return result.raw
 
     if isinstance(result, list) and result:
         last = result[-1]
         return getattr(last, "raw", str(last))
+    return str(result)
+
+
+async def _kickoff_timed(build_crew, stages) -> tuple[str, dict[str, float]]:
+    """Run the crew built by build_crew(task_callback) and time each of its tasks."""
+    timings = {}
+    last = [time.perf_counter()]
+
+    def on_task_done(output):
+        now = time.perf_counter()
+        stage = stages[len(timings)] if len(timings) < len(stages) else f"task_{len(timings) + 1}"
+        timings[stage] = round((now - last[0]) * 1000, 1)
+        last[0] = now
+
+    crew = build_crew(on_task_done)
+    result = await _run_in_executor(crew.kickoff)
+    return _crew_output(result), timings
+
+
+def _chat_mode(mode: str | None) -> str:
+    mode = mode or CHAT_PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown chat pipeline mode {mode!r}; expected one of {PIPELINE_MODES}")
+    return mode
+
+
+def _cache_namespace(store, namespace: str, question: str, k: int, filters: RetrievalFilter | None) -> str:
+    """Semantic-cache namespace: pipeline, k, filters and the laws/article numbers the question cites,
+    so "المادة 77" and "المادة 78" never share an answer however close their embeddings are."""
+    refs = store.article_index.reference_key(question) if store.article_index is not None else reference_key(question)
+    return f"{namespace}:{k}" + (f":{filters.key()}" if filters is not None else "") + f":{refs}"
 
-   
-    return result.raw.strip()
-async def run_chat_stream(question: str, k: int = 20):
 
-    docs = vector_db.similarity_search(question, k=k)
-    crew = create_crew(llm, question, docs)
+async def _run_cached(namespace: str, question: str, k: int, run_pipeline, filters: RetrievalFilter | None = None) -> dict:
+    """Answer from the semantic cache when a near-identical question was answered against the
+    current store (with the same filters), otherwise retrieve and run `run_pipeline(docs)` →
+    (answer, stage timings) and cache its answer. Per-stage latencies (ms) are returned under "timings".
 
-    answer = await run_chat(question, k)
-    yield answer
+    The store is only held (and so only delays a hot swap) while retrieving."""
+    timings = {}
+    start = time.perf_counter()
+    vector = await _run_in_executor(embed_query, question)
+    timings["embedding"] = elapsed_ms(start)
+    with law_store.acquire() as store:
+        namespace = _cache_namespace(store, namespace, question, k, filters)
+        fingerprint = store_fingerprint(store.path)
+        answer = _answer_cache.get(namespace, vector, fingerprint)
+        if answer is None:
+            start = time.perf_counter()
+            docs = await _run_in_executor(retrieve, store, question, vector, k, filters)
+            timings["retrieval"] = elapsed_ms(start)
+    if answer is not None:
+        return {"answer": answer, "cached": True, "timings": timings}
 
-async def run_chat_stream(question: str, k: int = 20):
-    docs = vector_db.similarity_search(question, k=k)
-    crew = create_crew(llm, question, docs)
-    answer = await run_chat(question, k)
-    yield answer
+    answer, stage_timings = await run_pipeline(docs)
+    timings.update(stage_timings)
+    _answer_cache.put(namespace, vector, answer, fingerprint)
+    return {"answer": answer, "cached": False, "timings": timings}
 
-async def run_roadmap(question: str, k: int = 20) -> str:
-    docs = vector_db.similarity_search(question, k=k)
-    crew = create_roadmap_crew(llm, question, docs)
+
+async def run_chat(question: str, k: int = 20, mode: str | None = None, filters: RetrievalFilter | None = None) -> dict:
+    mode = _chat_mode(mode)
+    await startup.wait_async()
+    start = time.perf_counter()
+    with law_store.acquire() as store:
+        hit = _direct_article(store, question, filters)
+    if hit:
+        # "ما نص المادة ٧٧ من نظام العمل": the article itself is the answer
+        return {"answer": format_article_answer(hit), "cached": False, "mode": "lookup",
+                "timings": {"lookup": elapsed_ms(start)}}
+
+    async def pipeline(docs):
+        if mode == "single":
+            return await run_single_call(llm, question, docs)
+        if mode == "two_call":
+            return await run_two_call(llm, question, docs)
+        return await _kickoff_timed(
+            lambda callback: create_crew(_crew_llm(), question, docs, task_callback=callback),
+            ("research", "writing", "review"),
+        )
+
+    result = await _run_cached(f"chat:{mode}", question, k, pipeline, filters)
+    result["mode"] = mode
+    return result
+
+
+async def run_chat_stream(question: str, k: int = 20, mode: str | None = None, filters: RetrievalFilter | None = None):
+    """Yield (event, data) pairs for the chat pipeline as it runs.
+
+    Retrieval happens once and a "progress" event follows it and every intermediate stage. The
+    last LLM call of the selected mode (the single answer, the writer, or the crew manager's
+    review) runs as a direct streaming call whose text arrives as "token" events; a final "done"
+    event reports the mode, whether the answer came from the cache and the per-stage latencies
+    (ms) under "timings", keyed like run_chat's.
+    """
+    mode = _chat_mode(mode)
+    await startup.wait_async()
+    timings = {}
+    start = time.perf_counter()
+    with law_store.acquire() as store:
+        hit = _direct_article(store, question, filters)
+    if hit:
+        yield "token", format_article_answer(hit)
+        yield "done", {"cached": False, "mode": "lookup", "timings": {"lookup": elapsed_ms(start)}}
+        return
 
     loop = asyncio.get_event_loop()
-    result = await loop.run_in_executor(_executor, crew.kickoff)
+    start = time.perf_counter()
+    vector = await _run_in_executor(embed_query, question)
+    timings["embedding"] = elapsed_ms(start)
+    with law_store.acquire() as store:
+        namespace = _cache_namespace(store, f"chat:{mode}", question, k, filters)
+        fingerprint = store_fingerprint(store.path)
+        answer = _answer_cache.get(namespace, vector, fingerprint)
+        if answer is None:
+            start = time.perf_counter()
+            docs = await _run_in_executor(retrieve, store, question, vector, k, filters)
+            timings["retrieval"] = elapsed_ms(start)
+    if answer is not None:
+        yield "token", answer
+        yield "done", {"cached": True, "mode": mode, "timings": timings}
+        return
 
-    if isinstance(result, str):
-        return result
-    if hasattr(result, "raw"):              # CrewOutput
-        return result.raw
-    return str(result)
\ No newline at end of file
+    yield "progress", {"stage": "retrieval", "chunks": len(docs)}
+
+    start = time.perf_counter()
+    if mode == "single":
+        final_stage = "answer"
+        final_messages = single_call_messages(question, docs)
+    elif mode == "two_call":
+        final_stage = "writing"
+        research = await llm.ainvoke(research_messages(question, docs))
+        timings["research"] = elapsed_ms(start)
+        yield "progress", {"stage": "research"}
+        final_messages = writing_messages(question, research.content)
+    else:
+        final_stage = "review"
+        # crew.kickoff runs on a worker thread; its task callback hands each finished task back to the loop
+        finished = asyncio.Queue()
+        crew = create_crew(
+            _crew_llm(), question, docs, include_review=False,
+            task_callback=lambda output: loop.call_soon_threadsafe(finished.put_nowait, output)
+        )
+        kickoff = _run_in_executor(crew.kickoff)
+        for stage in ("research", "writing"):
+            next_task = asyncio.ensure_future(finished.get())
+            done, _ = await asyncio.wait({next_task, kickoff}, return_when=asyncio.FIRST_COMPLETED)
+            if next_task not in done:
+                next_task.cancel()
+                break
+            timings[stage] = elapsed_ms(start)
+            start = time.perf_counter()
+            yield "progress", {"stage": stage}
+        final_messages = review_messages(_crew_output(await kickoff))
+        yield "progress", {"stage": "review"}
+
+    start = time.perf_counter()
+    answer = ""
+    async for chunk in llm.astream(final_messages):
+        if chunk.content:
+            answer += chunk.content
+            yield "token", chunk.content
+    timings[final_stage] = elapsed_ms(start)
+
+    _answer_cache.put(namespace, vector, answer, fingerprint)
+    yield "done", {"cached": False, "mode": mode, "timings": timings}
+
+
+async def run_roadmap(question: str, k: int = 20, filters: RetrievalFilter | None = None) -> dict:
+    await startup.wait_async()
+    return await _run_cached("roadmap", question, k, lambda docs: _kickoff_timed(
+        lambda callback: create_roadmap_crew(_crew_llm(), question, format_context(docs), task_callback=callback),
+        ("research", "plan", "review"),
+    ), filters)
@@ -0,0 +1,71 @@
+"""Background loading of the API's heavy resources, with per-phase timings.
+
+services.py registers its phases (LLM clients, FAISS store, BM25/article/filter indexes, CrewAI,
+the virtual judge)
+and main.py starts them when the app boots, so the worker accepts connections at once: /health
+answers immediately and /ready turns 200 only after every phase has finished.
+"""
+from __future__ import annotations
+import time, asyncio, threading
+from typing import Callable, Optional, Sequence
+
+
+class StartupLoader:
+    def __init__(self, phases: Sequence[tuple[str, Callable[[], None]]]):
+        self.phases = list(phases)
+        self.status = {name: {"status": "pending"} for name, _ in self.phases}
+        self.total_ms: Optional[float] = None
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Run the phases on a daemon thread; later calls are no-ops."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="startup-loader", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        try:
+            for name, load in self.phases:
+                self.status[name] = {"status": "loading"}
+                phase_start = time.perf_counter()
+                try:
+                    load()
+                except Exception as e:
+                    self.status[name] = {"status": "failed", "error": str(e)}
+                    self.error = f"{name}: {e}"
+                    print(f"❌ Startup phase {name!r} failed: {e}")
+                    return
+                ms = round((time.perf_counter() - phase_start) * 1000, 1)
+                self.status[name] = {"status": "ready", "ms": ms}
+                print(f"⏱️ Startup phase {name!r} took {ms}ms")
+        finally:
+            self.total_ms = round((time.perf_counter() - started) * 1000, 1)
+            self._done.set()
+        print(f"✅ Ready after {self.total_ms}ms")
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and self.error is None
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Block until loading is over (starting it if needed); raises if a phase failed."""
+        self.start()
+        if not self._done.wait(timeout):
+            raise TimeoutError("Startup is still loading")
+        if self.error is not None:
+            raise RuntimeError(f"Startup failed: {self.error}")
+
+    async def wait_async(self) -> None:
+        self.start()
+        if not self._done.is_set():
+            await asyncio.get_running_loop().run_in_executor(None, self._done.wait)
+        self.wait(0)
+
+    def report(self) -> dict:
+        state = "ready" if self.ready else "failed" if self.error else "loading"
+        return {"status": state, "total_ms": self.total_ms, "phases": dict(self.status)}
@@ -0,0 +1,29 @@
+from __future__ import annotations
+import functools
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken ships with langchain-openai, but keep a fallback for slim environments
+    tiktoken = None
+
+
+@functools.lru_cache(maxsize=8)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # The BPE files are downloaded on first use; offline containers fall back to the estimate
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Number of tokens `text` costs for `model` (a chars/3 estimate when tiktoken is unavailable)."""
+    enc = _encoding(model)
+    if enc is None:
+        # Arabic averages roughly three characters per token
+        return len(text) // 3 + 1
+    return len(enc.encode(text, disallowed_special=()))
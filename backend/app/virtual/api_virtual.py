@@ -0,0 +1,53 @@
+import json
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+router = APIRouter(prefix="/api", tags=["virtual"])
+
+
+class JudgeRequest(BaseModel):
+    description: str
+
+
+def _sse(event, payload):
+    # json.dumps escapes newlines, so every payload fits on a single data: line
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@router.post("/virtual/judge/stream")
+async def judge_stream(req: JudgeRequest):
+    """Run the virtual judge, streaming phase-1 matches per batch and then the judgment as it is written.
+
+    Events: "matches" (one per scanned batch), "scan" (batches scanned/skipped), "judgment"
+    (partial judgment JSON, repeated as it grows; the last one is complete), then "done".
+    """
+    async def event_generator():
+        try:
+            # openSdk creates its OpenAI clients and loads the case index tooling on import, so it is
+            # imported by the startup loader in the background rather than when the app is imported
+            from backend.app.services import startup
+            await startup.wait_async()
+            from backend.app.virtual.openSdk import init_model, load_database, stream_matching_cases, stream_final_judgment
+
+            model = init_model()
+            database = await asyncio.to_thread(load_database)
+            by_batch = {}
+            async for result in stream_matching_cases(model["phase1"], database, req.description):
+                if "batch" not in result:
+                    yield _sse("scan", result)
+                    continue
+                by_batch[result["batch"]] = result["matches"]
+                yield _sse("matches", result)
+
+            matched_cases = [match for i in sorted(by_batch) for match in by_batch[i]]
+            case_input = {"description": req.description.strip()}
+            async for judgment in stream_final_judgment(model["phase2"], case_input, matched_cases):
+                yield _sse("judgment", judgment)
+            yield _sse("done", {"matched": len(matched_cases)})
+        except Exception as exc:
+            yield _sse("error", {"detail": str(exc)})
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
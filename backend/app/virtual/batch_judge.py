@@ -0,0 +1,147 @@
+"""Offline batch mode for the virtual judge.
+
+Several queued case descriptions share each phase-1 prompt, so every batch of case summaries is
+paid for once per group of queries instead of once per query. Results are per query, in the
+same shape find_matching_cases returns.
+
+    python -m backend.app.virtual.batch_judge queries.jsonl results.jsonl --group-size 5 --judge
+
+Each input line is {"id": ..., "description": ...} (id defaults to the line number).
+"""
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.app.virtual.openSdk import (
+    CASE_BATCH_TOKEN_BUDGET, CASE_PREFILTER_TOP_N, CASE_SCAN_CONCURRENCY, MAX_TOKENS,
+    ScanResult, fetch_openai_chat, generate_final_judgment, init_model, load_database,
+    pack_batches, prefilter_cases,
+)
+
+QUERIES_PER_PROMPT = 5
+# gpt-4o-mini caps a completion at 16k tokens; each query in the group gets the single-query allowance
+MAX_COMPLETION_TOKENS = 16000
+
+agent_phase1_multi = """
+أنت مختص قانوني سعودي تبحث في قضايا قانونية سعودية.
+سيتم تزويدك بقائمة قضايا تحتوي على case_id وملخص موجز لكل قضية، وبعدة قضايا للمستخدمين لكل منها معرّف query_id.
+قارن كل قضية من قضايا المستخدمين بالقائمة بشكل مستقل عن غيرها، وارجع لكل منها قائمة بالقضايا المشابهة مع ذكر سبب التشابه.
+صيغة الإخراج يجب أن تكون JSON فقط، كائن مفاتيحه query_id وقيمة كل مفتاح قائمة (فارغة إن لم توجد قضايا مشابهة):
+{"q1": [{"case_id": 1, "PointOfSimilarity": "السبب"}], "q2": []}
+"""
+
+
+def _scan_batch_multi(specfic_input, group, wait_timeout):
+    queries = "\n".join(f"## {query_id}\n{query}" for query_id, query in group)
+    user_input = f"""
+# القضايا المدخلة
+```json
+{specfic_input}
+```
+# القضايا التي سنقارنها
+{queries}
+# قم بارجاع jsonصحيح فقط
+"""
+
+    try:
+        content = fetch_openai_chat(
+            agent_phase1_multi, user_input, wait_timeout=wait_timeout,
+            max_tokens=min(MAX_TOKENS * len(group), MAX_COMPLETION_TOKENS)
+        )
+        content = content.replace("```json", "").replace("```", "").strip()
+        parsed = json.loads(content)
+        if not isinstance(parsed, dict):
+            parsed = {}
+    except Exception as e:
+        print("Error response:", e)
+        parsed = {}
+    return {query_id: parsed.get(query_id) if isinstance(parsed.get(query_id), list) else [] for query_id, _ in group}
+
+
+def _group_candidates(case_data, queries, top_n):
+    """Union of the queries' pre-filtered candidates (shared by the group's prompts), plus each
+    query's own candidate case_ids; a query only keeps matches it would have seen on its own."""
+    seen = set()
+    candidates = []
+    own_ids = []
+    for query in queries:
+        own = prefilter_cases(case_data, query, top_n)
+        own_ids.append({str(rec["case_id"]) for rec in own})
+        for rec in own:
+            if id(rec) not in seen:
+                seen.add(id(rec))
+                candidates.append(rec)
+    return candidates, own_ids
+
+
+def find_matching_cases_multi(case_data, queries, group_size=QUERIES_PER_PROMPT, batch_size=None, wait_timeout=3, top_n=CASE_PREFILTER_TOP_N, concurrency=CASE_SCAN_CONCURRENCY, token_budget=CASE_BATCH_TOKEN_BUDGET):
+    """Phase-1 scan for many queries at once; returns one ScanResult per query, in input order."""
+    if group_size < 1:
+        raise ValueError(f"group_size must be at least 1, got {group_size}")
+    groups = [
+        [(f"q{j + 1}", query) for j, query in enumerate(queries[i:i + group_size])]
+        for i in range(0, len(queries), group_size)
+    ]
+
+    jobs = []  # (group index, batch index, payload)
+    batch_counts = []
+    allowed = []   # per group: {query_id: case_ids from that query's own pre-filter}
+    for g, group in enumerate(groups):
+        candidates, own_ids = _group_candidates(case_data, [q for _, q in group], top_n)
+        allowed.append({query_id: ids for (query_id, _), ids in zip(group, own_ids)})
+        batches = pack_batches(candidates, token_budget, batch_size)
+        batch_counts.append(len(batches))
+        jobs += [(g, b, payload) for b, payload in enumerate(batches)]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(jobs) or 1))) as pool:
+        outputs = list(pool.map(lambda job: _scan_batch_multi(job[2], groups[job[0]], wait_timeout), jobs))
+
+    # pool.map keeps job order, so each query's matches are merged in batch order like the single-query path
+    results = []
+    for g, group in enumerate(groups):
+        group_outputs = [out for (job_g, _, _), out in zip(jobs, outputs) if job_g == g]
+        for query_id, _ in group:
+            matches = [
+                m for out in group_outputs for m in out[query_id]
+                if isinstance(m, dict) and str(m.get("case_id")) in allowed[g][query_id]
+            ]
+            results.append(ScanResult(matches, batch_counts[g], batch_counts[g]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many case descriptions through the virtual judge with shared case batches.")
+    parser.add_argument("input", help="JSONL file of {\"id\", \"description\"} records")
+    parser.add_argument("output", help="JSONL file to write per-query results to")
+    parser.add_argument("--database", default="data/cases.jsonl")
+    parser.add_argument("--group-size", type=int, default=QUERIES_PER_PROMPT, help="queries multiplexed into each prompt")
+    parser.add_argument("--judge", action="store_true", help="also generate the phase-2 judgment for each query")
+    args = parser.parse_args()
+    if args.group_size < 1:
+        parser.error("--group-size must be at least 1")
+
+    records = []
+    with open(args.input, encoding="utf8") as f:
+        for n, line in enumerate(f, 1):
+            if line.strip():
+                rec = json.loads(line)
+                records.append({"id": rec.get("id", n), "description": rec["description"]})
+
+    database = load_database(args.database)
+    print(f"📘 {len(records)} queries against {len(database)} cases (groups of {args.group_size})")
+    matches = find_matching_cases_multi(database, [r["description"] for r in records], group_size=args.group_size)
+
+    model = init_model()
+    with open(args.output, "w", encoding="utf8") as out:
+        for rec, matched_cases in zip(records, matches):
+            result = {"id": rec["id"], "matches": list(matched_cases)}
+            if args.judge:
+                case_input = {"description": rec["description"].strip()}
+                result["judgment"] = generate_final_judgment(model["phase2"], case_input, list(matched_cases))
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    print("✅ Saved:", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import math
+import functools
+
+from dotenv import load_dotenv
+from langchain_openai import OpenAIEmbeddings
+from langchain_community.vectorstores import FAISS
+
+load_dotenv()
+CASE_INDEX_PATH = os.getenv("CASE_INDEX_PATH", "data/case_vector_store")
+CASE_EMBEDDING_MODEL = "text-embedding-3-small"
+# Softness of the scan prior, in standard deviations of the top-N distances (lower = more mass on the closest cases)
+CASE_PRIOR_TEMPERATURE = float(os.getenv("CASE_PRIOR_TEMPERATURE", "0.5"))
+
+
+@functools.lru_cache(maxsize=4)
+def _load_index(path, mtime):
+    # mtime is part of the cache key so a rebuilt index is picked up without a restart
+    embedding_model = OpenAIEmbeddings(
+        model=CASE_EMBEDDING_MODEL,
+        openai_api_key=os.getenv("OPENAI_API_KEY")
+    )
+    return FAISS.load_local(
+        path,
+        embeddings=embedding_model,
+        allow_dangerous_deserialization=True
+    )
+
+
+def load_case_index(path=CASE_INDEX_PATH):
+    """Return the case summary index built by embeddings/build_case_index.py, or None if it is missing."""
+    index_file = os.path.join(path, "index.faiss")
+    if not os.path.exists(index_file):
+        return None
+    return _load_index(path, os.path.getmtime(index_file))
+
+
+@functools.lru_cache(maxsize=4)
+def _indexed_ids(path, mtime):
+    index = _load_index(path, mtime)
+    return frozenset(str(doc.metadata.get("case_id")) for doc in index.docstore._dict.values())
+
+
+def indexed_case_ids(path=CASE_INDEX_PATH):
+    """case_ids the index covers (None without an index); cases added since the last build are missing."""
+    index_file = os.path.join(path, "index.faiss")
+    if not os.path.exists(index_file):
+        return None
+    return _indexed_ids(path, os.path.getmtime(index_file))
+
+
+def _softmax_priors(distances, temperature=CASE_PRIOR_TEMPERATURE):
+    """Softmax of the negated, standardised distances; sums to 1.
+
+    Raw distances of the top-N summaries sit in a narrow band, so anything linear in them
+    (like 1 / (1 + d)) is nearly flat and a share of it just means a share of the candidates.
+    Standardising and sharpening puts most of the mass on the cases that stand out.
+    """
+    if not distances:
+        return []
+    mean = sum(distances) / len(distances)
+    std = math.sqrt(sum((d - mean) ** 2 for d in distances) / len(distances)) or 1.0
+    logits = [-(d - mean) / (std * max(temperature, 1e-6)) for d in distances]
+    top = max(logits)
+    weights = [math.exp(logit - top) for logit in logits]
+    total = sum(weights)
+    return [w / total for w in weights]
+
+
+def score_case_ids(query, top_n, path=CASE_INDEX_PATH):
+    """Return (case_id, prior) for the top_n summaries closest to the query, best first.
+
+    prior is a softmax over the top_n distances (see _softmax_priors), so the priors sum to 1
+    and a share of them estimates the share of relevant cases. Returns None when no index is
+    available so callers can fall back to a full scan.
+    """
+    try:
+        index = load_case_index(path)
+        if index is None:
+            return None
+        results = index.similarity_search_with_score(query, k=top_n)
+    except Exception as e:
+        print(f"Error searching case index: {e}")
+        return None
+
+    ranked = []
+    seen = set()
+    for doc, distance in results:
+        case_id = str(doc.metadata.get("case_id"))
+        if case_id not in seen:
+            seen.add(case_id)
+            ranked.append((case_id, float(distance)))
+    return [(case_id, prior) for (case_id, _), prior in zip(ranked, _softmax_priors([d for _, d in ranked]))]
+
+
+def rank_case_ids(query, top_n, path=CASE_INDEX_PATH):
+    """Return the case_ids of the top_n summaries closest to the query, best first (None without an index)."""
+    ranked = score_case_ids(query, top_n, path)
+    if ranked is None:
+        return None
+    return [case_id for case_id, _ in ranked]
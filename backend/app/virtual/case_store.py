@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import threading
+
+from backend.app.tokens import count_tokens
+
+
+def compact_case_payload(case_id, summary):
+    """Phase-1 JSON for one case: only the fields the model compares, with no whitespace."""
+    return json.dumps({"case_id": case_id, "summaryOfCase": summary}, ensure_ascii=False, separators=(",", ":"))
+
+
+_TERM_RE = re.compile(r"\w+")
+
+
+def payload_terms(text):
+    """Distinct lower-cased words (two characters or more) used for the lexical scan prior."""
+    return {t for t in _TERM_RE.findall(text.lower()) if len(t) > 1}
+
+
+class CaseRecord(dict):
+    """A case with only case_id and summaryOfCase resident.
+
+    whole_case is read from disk on access, so holding the whole archive costs only the summaries.
+    The compact phase-1 payload is serialized once here and reused by every query.
+    """
+
+    def __init__(self, store, case_id, summary):
+        super().__init__(case_id=case_id, summaryOfCase=summary)
+        self._store = store
+        self.payload = compact_case_payload(case_id, summary)
+        self._payload_tokens = None
+        self._terms = None
+
+    @property
+    def payload_tokens(self):
+        if self._payload_tokens is None:
+            self._payload_tokens = count_tokens(self.payload)
+        return self._payload_tokens
+
+    @property
+    def terms(self):
+        if self._terms is None:
+            self._terms = payload_terms(self.payload)
+        return self._terms
+
+    def __missing__(self, key):
+        if key == "whole_case":
+            return self._store.get_whole_case(self["case_id"])
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key == "whole_case" and not dict.__contains__(self, key):
+            whole_case = self._store.get_whole_case(self["case_id"])
+            return whole_case if whole_case is not None else default
+        return super().get(key, default)
+
+
+class CaseStore:
+    """Process-wide view of a cases.jsonl file, parsed once and reloaded when the file changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature = None
+        self._records = []
+        self._offsets = {}  # case_id -> (byte offset, byte length) of its line
+
+    def _file_signature(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self, signature):
+        records = []
+        offsets = {}
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                length = len(line)
+                if line.strip():
+                    rec = json.loads(line)
+                    case_id = rec["case_id"]
+                    records.append(CaseRecord(self, case_id, rec["summaryOfCase"]))
+                    offsets[str(case_id)] = (offset, length)
+                offset += length
+        self._records = records
+        self._offsets = offsets
+        self._signature = signature
+
+    def _ensure_fresh(self):
+        signature = self._file_signature()
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._load(signature)
+
+    def records(self):
+        self._ensure_fresh()
+        return self._records
+
+    def get_whole_case(self, case_id):
+        self._ensure_fresh()
+        entry = self._offsets.get(str(case_id))
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            rec = json.loads(f.read(length))
+        return rec.get("whole_case", {})
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_case_store(path):
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = CaseStore(path)
+    return store
@@ -1,22 +1,52 @@
+import os
 import json
-import openai
 import math
-from openai import OpenAI
+import time
+import random
+import asyncio
+import logging
+import weakref
+import openai
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from openai import OpenAI, AsyncOpenAI
+
+from backend.app.virtual.case_index import rank_case_ids, score_case_ids, indexed_case_ids
+from backend.app.virtual.case_store import get_case_store, compact_case_payload, payload_terms
+from backend.app.tokens import count_tokens
+from backend.app.llm_cache import get_llm_cache, make_key
+from backend.app.virtual.throttle import RateLimiter
+from backend.app.virtual.partial_json import parse_partial_json
+
+logger = logging.getLogger(__name__)
+
+# Only the top-N cases closest to the query (by summary embedding) go to the phase-1 LLM.
+# Set to 0 to disable the pre-filter and scan the whole archive.
+CASE_PREFILTER_TOP_N = int(os.getenv("CASE_PREFILTER_TOP_N", "300"))
+
+# Phase-1 batches in flight at once, and the account limits every call in this process shares (0 = unlimited).
+CASE_SCAN_CONCURRENCY = int(os.getenv("CASE_SCAN_CONCURRENCY", "8"))
+# Prompt tokens of case summaries packed into each phase-1 call.
+CASE_BATCH_TOKEN_BUDGET = int(os.getenv("CASE_BATCH_TOKEN_BUDGET", "30000"))
+# Early termination: stop starting new batches once this many matches were found, or once the scanned
+# batches cover this share of the similarity prior (0 = scan everything).
+CASE_SCAN_MAX_MATCHES = int(os.getenv("CASE_SCAN_MAX_MATCHES", "0"))
+CASE_SCAN_RECALL_TARGET = float(os.getenv("CASE_SCAN_RECALL_TARGET", "0"))
+# Batches in flight while one of those stop rules is set (0 = CASE_SCAN_CONCURRENCY). A batch already
+# sent can't be skipped, so 1-2 makes the stop strict at the cost of scanning sequentially.
+CASE_SCAN_EARLY_STOP_CONCURRENCY = int(os.getenv("CASE_SCAN_EARLY_STOP_CONCURRENCY", "0")) or CASE_SCAN_CONCURRENCY
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
 
 
 def load_database(database_path: str="data/cases.jsonl", max_items: int=None):
-    database = []
+    """Return the cases in database_path from the process-wide case store.
+
+    The file is parsed once and only re-read when it changes; each record keeps case_id and
+    summaryOfCase in memory and reads its whole_case from disk on access.
+    """
     try:
-        with open(database_path, encoding="utf8") as f:
-            for line in f:
-                if line.strip() == "":
-                    continue
-                rec = json.loads(line)
-                database.append({
-                    "case_id": rec["case_id"],
-                    "summaryOfCase": rec["summaryOfCase"],
-                    "whole_case": rec.get("whole_case", {})
-                })
+        database = get_case_store(database_path).records()
         return database if not max_items else database[:max_items]
     except Exception as e:
         print(f"Error loading database: {e}")
@@ -65,17 +95,120 @@ agent_phase2 = """
 
 llm = OpenAI(api_key=(""
 ))
-def fetch_openai_chat(context, input):
-    response = llm.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": context},
-            {"role": "user", "content": input}
-        ],
-        temperature=0.5,
-        max_tokens=2000
-    )
-    return response.choices[0].message.content
+_async_clients = weakref.WeakKeyDictionary()
+rate_limiter = RateLimiter(rpm=OPENAI_RPM_LIMIT, tpm=OPENAI_TPM_LIMIT)
+
+MODEL_NAME = "gpt-4o-mini"
+TEMPERATURE = 0.5
+MAX_TOKENS = 2000
+
+
+def _messages(context, input):
+    return [
+        {"role": "system", "content": context},
+        {"role": "user", "content": input}
+    ]
+
+
+def _async_llm():
+    """AsyncOpenAI client for the running event loop.
+
+    Its pooled connections belong to the loop that opened them, and callers such as
+    pages/test.py drive each stream on a fresh loop, so one client is kept per loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncOpenAI(api_key=llm.api_key)
+    return client
+
+
+def _retry_delay(error, attempt, wait_timeout):
+    retry_after = error.response.headers.get("retry-after") if error.response is not None else None
+    try:
+        delay = float(retry_after)
+    except (TypeError, ValueError):
+        delay = wait_timeout * 2 ** attempt
+    return delay + random.uniform(0, 1)
+
+
+def _cached(messages, max_tokens, use_cache):
+    # (cache, key) for this call, or (None, None) when caching is off for it
+    cache = get_llm_cache() if use_cache else None
+    if cache is None:
+        return None, None
+    return cache, make_key(MODEL_NAME, messages, TEMPERATURE, max_tokens)
+
+
+def fetch_openai_chat(context, input, max_retries=5, wait_timeout=3, max_tokens=MAX_TOKENS, use_cache=True):
+    messages = _messages(context, input)
+    cache, key = _cached(messages, max_tokens, use_cache)
+    if cache is not None:
+        content = cache.get(key)
+        if content is not None:
+            return content
+
+    # The TPM budget is charged for the prompt plus the completion the request may produce
+    rate_limiter.acquire(count_tokens(context) + count_tokens(input) + max_tokens)
+    for attempt in range(max_retries + 1):
+        try:
+            response = llm.chat.completions.create(
+                model=MODEL_NAME,
+                messages=messages,
+                temperature=TEMPERATURE,
+                max_tokens=max_tokens
+            )
+            content = response.choices[0].message.content
+            if cache is not None and content and response.choices[0].finish_reason == "stop":
+                cache.set(key, content)
+            return content
+        except openai.RateLimitError as e:
+            if attempt == max_retries:
+                raise
+            time.sleep(_retry_delay(e, attempt, wait_timeout))
+
+
+async def stream_openai_chat(context, input, max_retries=5, wait_timeout=3, use_cache=True):
+    """Async variant of fetch_openai_chat that yields the completion text as it is generated.
+
+    A cache hit is yielded as a single chunk; a completed stream is stored like fetch_openai_chat's result.
+    """
+    messages = _messages(context, input)
+    cache, key = _cached(messages, MAX_TOKENS, use_cache)
+    if cache is not None:
+        content = await asyncio.to_thread(cache.get, key)
+        if content is not None:
+            yield content
+            return
+
+    await asyncio.to_thread(rate_limiter.acquire, count_tokens(context) + count_tokens(input) + MAX_TOKENS)
+    for attempt in range(max_retries + 1):
+        try:
+            stream = await _async_llm().chat.completions.create(
+                model=MODEL_NAME,
+                messages=messages,
+                temperature=TEMPERATURE,
+                max_tokens=MAX_TOKENS,
+                stream=True
+            )
+            break
+        except openai.RateLimitError as e:
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(_retry_delay(e, attempt, wait_timeout))
+
+    content = ""
+    finish_reason = None
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        finish_reason = chunk.choices[0].finish_reason or finish_reason
+        if chunk.choices[0].delta.content:
+            content += chunk.choices[0].delta.content
+            yield chunk.choices[0].delta.content
+    # Only complete streams are cached; an abandoned or truncated one would poison later hits
+    if cache is not None and content and finish_reason == "stop":
+        await asyncio.to_thread(cache.set, key, content)
 
 def init_model():
     return {
@@ -89,17 +222,157 @@ def init_model():
 
 
 
-def find_matching_cases(initial_stage_model, case_data, query, batch_size=100, wait_timeout=3, progress=None):
-    matching_cases  = []
-    total_batches = math.ceil(len(case_data) / batch_size)
-
-    for i in range(total_batches):
-        batch = case_data[i*batch_size:(i+1)*batch_size]
-        specfic_input = json.dumps([
-            {"case_id": rec["case_id"], "summaryOfCase": rec["summaryOfCase"]} for rec in batch
-        ], ensure_ascii=False, indent=2)
-
-        user_input = f"""
+def _unindexed_cases(case_data):
+    """Cases the (possibly stale) case index does not cover; the pre-filter can never rank them."""
+    indexed = indexed_case_ids()
+    if indexed is None:
+        return []
+    missing = [rec for rec in case_data if str(rec["case_id"]) not in indexed]
+    if missing:
+        print(f"⚠️ {len(missing)} cases are not in the case index; scanning them too (rebuild it with embeddings/build_case_index.py)")
+    return missing
+
+
+def prefilter_cases(case_data, query, top_n=CASE_PREFILTER_TOP_N):
+    """Keep only the top_n candidates from the case index, ordered best first, followed by any
+    cases added since the index was built.
+
+    Falls back to the full case_data when the pre-filter is disabled, the archive is
+    already small enough, or the index has not been built.
+    """
+    if not top_n or len(case_data) <= top_n:
+        return case_data
+    ranked = rank_case_ids(query, top_n)
+    if ranked is None:
+        return case_data
+    by_id = {str(rec["case_id"]): rec for rec in case_data}
+    return [by_id[case_id] for case_id in ranked if case_id in by_id] + _unindexed_cases(case_data)
+
+
+def lexical_priors(case_data, query):
+    """IDF-weighted overlap between the query's terms and each case summary."""
+    query_terms = payload_terms(query)
+    term_sets = [getattr(rec, "terms", None) or payload_terms(_case_payload(rec)[0]) for rec in case_data]
+    df = Counter(t for terms in term_sets for t in terms & query_terms)
+    idf = {t: math.log(1 + len(case_data) / n) for t, n in df.items()}
+    return [sum(idf[t] for t in terms & query_terms) for terms in term_sets]
+
+
+def rank_candidates(case_data, query, top_n=CASE_PREFILTER_TOP_N):
+    """Order case_data best first by a cheap prior and return (cases, priors).
+
+    The prior is the summary-embedding similarity when the case index exists (keeping only
+    top_n plus unindexed cases, like prefilter_cases), otherwise the lexical overlap with the query.
+    """
+    if not case_data:
+        return [], []
+    k = min(top_n, len(case_data)) if top_n else len(case_data)
+    scored = score_case_ids(query, k)
+    if scored is not None:
+        by_id = {str(rec["case_id"]): rec for rec in case_data}
+        pairs = [(by_id[case_id], score) for case_id, score in scored if case_id in by_id]
+        # Unindexed cases go last, at the lowest indexed prior, so they still count towards recall
+        floor = min((score for _, score in pairs), default=1.0)
+        pairs += [(rec, floor) for rec in _unindexed_cases(case_data)]
+    else:
+        pairs = sorted(zip(case_data, lexical_priors(case_data, query)), key=lambda p: -p[1])
+    return [rec for rec, _ in pairs], [score for _, score in pairs]
+
+
+def _case_payload(rec):
+    payload = getattr(rec, "payload", None)
+    if payload is None:
+        payload = compact_case_payload(rec["case_id"], rec["summaryOfCase"])
+    tokens = getattr(rec, "payload_tokens", None)
+    if tokens is None:
+        tokens = count_tokens(payload)
+    return payload, tokens
+
+
+def _group_batches(case_data, token_budget, batch_size):
+    # (start, end) slices of case_data; order is preserved so the best-ranked cases come first
+    groups = []
+    start, current_tokens = 0, 0
+    for i, rec in enumerate(case_data):
+        _, tokens = _case_payload(rec)
+        full = i > start and (current_tokens + tokens + 1 > token_budget or (batch_size and i - start >= batch_size))
+        if full:
+            groups.append((start, i))
+            start, current_tokens = i, 0
+        current_tokens += tokens + 1
+    if start < len(case_data):
+        groups.append((start, len(case_data)))
+    return groups
+
+
+def _batch_payload(batch):
+    return "[" + ",".join(_case_payload(rec)[0] for rec in batch) + "]"
+
+
+def pack_batches(case_data, token_budget=CASE_BATCH_TOKEN_BUDGET, batch_size=None):
+    """Split case_data, in order, into batches whose summaries fit token_budget.
+
+    Each batch is returned as its JSON array payload. batch_size optionally caps cases per batch;
+    a single case larger than the budget still gets a batch of its own.
+    """
+    return [_batch_payload(case_data[start:end]) for start, end in _group_batches(case_data, token_budget, batch_size)]
+
+
+class ScanResult(list):
+    """Merged phase-1 matches, plus how much of the scan actually ran."""
+
+    def __init__(self, matches=(), total_batches=0, scanned_batches=0):
+        super().__init__(matches)
+        self.total_batches = total_batches
+        self.scanned_batches = scanned_batches
+
+    @property
+    def skipped_batches(self):
+        return self.total_batches - self.scanned_batches
+
+
+class _StopRule:
+    """Early-termination test over the batches scanned so far (disabled when both limits are 0)."""
+
+    def __init__(self, max_matches=0, recall_target=0, batch_priors=None):
+        self.max_matches = max_matches
+        self.recall_target = recall_target
+        self.batch_priors = batch_priors
+        self.total_prior = sum(batch_priors) if batch_priors else 0
+
+    @property
+    def active(self):
+        return bool(self.max_matches or self.recall_target)
+
+    def workers(self, concurrency, total_batches):
+        """Batches to keep in flight; at most CASE_SCAN_EARLY_STOP_CONCURRENCY while the rule is active."""
+        if self.active:
+            concurrency = min(concurrency, CASE_SCAN_EARLY_STOP_CONCURRENCY)
+        return max(1, min(concurrency, total_batches))
+
+    def reached(self, results):
+        if self.max_matches and sum(len(m) for m in results.values()) >= self.max_matches:
+            return True
+        if self.recall_target and self.total_prior > 0:
+            # Share of the prior mass already scanned, as an estimate of recall
+            covered = sum(self.batch_priors[i] for i in results) / self.total_prior
+            return covered >= self.recall_target
+        return False
+
+
+def _plan_scan(case_data, query, top_n, token_budget, batch_size, max_matches, recall_target):
+    if max_matches or recall_target:
+        case_data, priors = rank_candidates(case_data, query, top_n)
+    else:
+        case_data, priors = prefilter_cases(case_data, query, top_n), None
+    groups = _group_batches(case_data, token_budget, batch_size)
+    batches = [_batch_payload(case_data[start:end]) for start, end in groups]
+    batch_priors = [sum(priors[start:end]) for start, end in groups] if priors is not None else None
+    return batches, _StopRule(max_matches, recall_target, batch_priors)
+
+
+def _scan_batch(initial_stage_model, specfic_input, query, wait_timeout):
+    user_input = f"""
 # القضايا المدخلة
 ```json
 {specfic_input}
@@ -109,30 +382,116 @@ def find_matching_cases(initial_stage_model, case_data, query, batch_size=100, w
 # قم بارجاع jsonصحيح فقط
 """
 
-        try:
-            content = fetch_openai_chat(initial_stage_model["system"], user_input)
-            content = content.replace("```json", "").replace("```", "").strip()
-            matching_cases  += json.loads(content)
-        except Exception as e:
-            print("Error response:", e)
-        if progress:
-            progress.value += 1
-    return matching_cases
-
-
-
-
-def generate_final_judgment(final_stage_model, case_input, matched_cases):
+    try:
+        content = fetch_openai_chat(initial_stage_model["system"], user_input, wait_timeout=wait_timeout)
+        content = content.replace("```json", "").replace("```", "").strip()
+        parsed = json.loads(content)
+    except Exception as e:
+        logger.warning("Phase-1 batch failed: %s", e)
+        return []
+    # Anything but a list of match objects (e.g. a JSON object) would be merged as bogus matches
+    if not isinstance(parsed, list):
+        logger.warning("Phase-1 batch returned %s instead of a list; ignoring it", type(parsed).__name__)
+        return []
+    return [m for m in parsed if isinstance(m, dict)]
+
+
+def find_matching_cases(initial_stage_model, case_data, query, batch_size=None, wait_timeout=3, progress=None, top_n=CASE_PREFILTER_TOP_N, concurrency=CASE_SCAN_CONCURRENCY, token_budget=CASE_BATCH_TOKEN_BUDGET, max_matches=CASE_SCAN_MAX_MATCHES, recall_target=CASE_SCAN_RECALL_TARGET):
+    """Run the phase-1 scan and return a ScanResult (a list of matches).
+
+    With max_matches or recall_target set, batches are scanned best-prior first, at most
+    CASE_SCAN_EARLY_STOP_CONCURRENCY at a time, and no new batch is started once enough matches
+    were found or the scanned batches hold recall_target of the (softmax-calibrated) prior mass; the result's skipped_batches reports
+    how many were never sent.
+    """
+    batches, stop_rule = _plan_scan(case_data, query, top_n, token_budget, batch_size, max_matches, recall_target)
+    total_batches = len(batches)
+    if not batches:
+        return ScanResult()
+
+    results = {}
+    workers = stop_rule.workers(concurrency, total_batches)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        next_batch = 0
+        while True:
+            while next_batch < total_batches and len(in_flight) < workers and not stop_rule.reached(results):
+                future = pool.submit(_scan_batch, initial_stage_model, batches[next_batch], query, wait_timeout)
+                in_flight[future] = next_batch
+                next_batch += 1
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[in_flight.pop(future)] = future.result()
+                if progress:
+                    progress.value += 1
+
+    # Batches complete in any order but are merged in batch order so the output is deterministic
+    matching_cases  = []
+    for i in sorted(results):
+        matching_cases  += results[i]
+    return ScanResult(matching_cases, total_batches, len(results))
+
+
+async def stream_matching_cases(initial_stage_model, case_data, query, batch_size=None, wait_timeout=3, top_n=CASE_PREFILTER_TOP_N, concurrency=CASE_SCAN_CONCURRENCY, token_budget=CASE_BATCH_TOKEN_BUDGET, max_matches=CASE_SCAN_MAX_MATCHES, recall_target=CASE_SCAN_RECALL_TARGET):
+    """Async-generator variant of find_matching_cases that yields each batch's matches as soon as it completes.
+
+    Yields {"batch", "total_batches", "matches"} dicts in completion order ("batch" is the index
+    find_matching_cases would merge that batch at), then a final
+    {"total_batches", "scanned_batches", "skipped_batches"} summary.
+    """
+    loop = asyncio.get_running_loop()
+    # Ranking embeds the query and may load the case index; keep that off the event loop
+    batches, stop_rule = await loop.run_in_executor(
+        None, _plan_scan, case_data, query, top_n, token_budget, batch_size, max_matches, recall_target
+    )
+    total_batches = len(batches)
+    if not batches:
+        return
+
+    workers = stop_rule.workers(concurrency, total_batches)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    results = {}
+    in_flight = {}
+    try:
+        next_batch = 0
+        while True:
+            while next_batch < total_batches and len(in_flight) < workers and not stop_rule.reached(results):
+                future = loop.run_in_executor(pool, _scan_batch, initial_stage_model, batches[next_batch], query, wait_timeout)
+                in_flight[future] = next_batch
+                next_batch += 1
+            if not in_flight:
+                break
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                i = in_flight.pop(future)
+                results[i] = future.result()
+                yield {"batch": i, "total_batches": total_batches, "matches": results[i]}
+        yield {"total_batches": total_batches, "scanned_batches": len(results), "skipped_batches": total_batches - len(results)}
+    finally:
+        for future in in_flight:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+
+
+def _judgment_input(case_input, matched_cases):
     input_json = json.dumps(case_input, ensure_ascii=False, indent=2)
     matched_json = json.dumps(matched_cases, ensure_ascii=False, indent=2)
 
-    user_input = f"""
+    return f"""
 # تفاصيل القضية:
 {input_json}
 # القضايا المشابهة:
 {matched_json}
 # رجاءً أعد فقط JSON صحيح
 """
+
+
+def generate_final_judgment(final_stage_model, case_input, matched_cases):
+    user_input = _judgment_input(case_input, matched_cases)
     try:
         content = fetch_openai_chat(final_stage_model["system"], user_input)
         content = content.replace("```json", "").replace("```", "").strip()
@@ -142,6 +501,23 @@ def generate_final_judgment(final_stage_model, case_input, matched_cases):
         return None
 
 
+async def stream_final_judgment(final_stage_model, case_input, matched_cases):
+    """Stream the phase-2 judgment, yielding the partially parsed JSON each time it grows.
+
+    Every yielded dict holds whatever of similar_cases, Source and predicted_judgment has arrived
+    so far (the last list item or string may still be incomplete); the final one is the full judgment.
+    """
+    user_input = _judgment_input(case_input, matched_cases)
+    content = ""
+    last = None
+    async for delta in stream_openai_chat(final_stage_model["system"], user_input):
+        content += delta
+        snapshot = parse_partial_json(content)
+        if isinstance(snapshot, dict) and snapshot != last:
+            last = snapshot
+            yield snapshot
+
+
 
 
 
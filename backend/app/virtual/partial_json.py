@@ -0,0 +1,64 @@
+import json
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def strip_fences(text):
+    return text.replace("```json", "").replace("```", "").strip()
+
+
+def parse_partial_json(text):
+    """Best-effort parse of a JSON document that is still being streamed.
+
+    Open strings, arrays and objects are closed so everything received so far is returned; a
+    trailing key or value that cannot be completed yet is dropped. Returns None when nothing
+    parseable has arrived.
+    """
+    text = strip_fences(text)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    s = text[min(starts):]
+
+    stack = []
+    checkpoints = []  # (cut position, closers needed) where the prefix is a complete structure
+    in_str = esc = False
+    for i, ch in enumerate(s):
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+            checkpoints.append((i + 1, "".join(reversed(stack))))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                try:
+                    return json.loads(s[:i + 1])
+                except ValueError:
+                    return None
+        elif ch == ",":
+            checkpoints.append((i, "".join(reversed(stack))))
+
+    tail = s
+    if in_str:
+        if esc:
+            tail = tail[:-1]
+        tail += '"'
+    candidates = [tail.rstrip() + "".join(reversed(stack))]
+    # Fall back to the last few structural boundaries if the tail is a dangling key, colon or literal
+    candidates += [s[:pos] + closers for pos, closers in reversed(checkpoints[-3:])]
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    return None
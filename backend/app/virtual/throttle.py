@@ -0,0 +1,51 @@
+import time
+import threading
+from collections import deque
+
+
+class RateLimiter:
+    """Sliding one-minute window over requests and tokens, shared by every thread in the process.
+
+    A limit of 0 disables that dimension. acquire() blocks until the call fits in both budgets.
+    """
+
+    def __init__(self, rpm=0, tpm=0, window=60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self._calls = deque()  # (timestamp, tokens)
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._calls and now - self._calls[0][0] >= self.window:
+            _, tokens = self._calls.popleft()
+            self._tokens -= tokens
+
+    def _wait_time(self, now, tokens):
+        waits = [0.0]
+        if self.rpm and len(self._calls) >= self.rpm:
+            waits.append(self._calls[len(self._calls) - self.rpm][0] + self.window - now)
+        if self.tpm and self._calls and self._tokens + tokens > self.tpm:
+            # Free enough of the oldest calls to make room; a single oversized call waits for an empty window
+            freed = self._tokens
+            for ts, used in self._calls:
+                freed -= used
+                if freed + tokens <= self.tpm:
+                    waits.append(ts + self.window - now)
+                    break
+            else:
+                waits.append(self._calls[-1][0] + self.window - now)
+        return max(waits)
+
+    def acquire(self, tokens=0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self._calls.append((now, tokens))
+                    self._tokens += tokens
+                    return
+            time.sleep(wait)
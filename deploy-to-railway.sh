@@ -20,7 +20,6 @@ required_files=(
     "Requirements.txt"
     "backend/app/main.py"
     "data/cases.jsonl"
-    "data/laws_index.json"
     "embeddings/build_faiss.py"
 )
 
@@ -33,6 +32,14 @@ for file in "${required_files[@]}"; do
     fi
 done
 
+# The law index is data/laws_index.jsonl (or its shards); the older laws_index.json is still read
+if ls data/laws_index.jsonl data/laws_index.*-of-*.jsonl data/laws_index.json >/dev/null 2>&1; then
+    echo "✅ data/laws_index.jsonl"
+else
+    echo "❌ Missing: data/laws_index.jsonl"
+    missing_files=true
+fi
+
 if [ "$missing_files" = true ]; then
     echo "❌ Some required files are missing. Please check the project structure."
     exit 1
@@ -58,7 +65,7 @@ fi
 echo ""
 echo "📊 Data size summary:"
 echo "   - cases.jsonl: $(du -h data/cases.jsonl | cut -f1)"
-echo "   - laws_index.json: $(du -h data/laws_index.json | cut -f1)"
+echo "   - law index: $(du -ch data/laws_index*.json* 2>/dev/null | tail -1 | cut -f1)"
 echo "   - legal_sources.txt: $(du -h data/legal_sources.txt | cut -f1)"
 
 echo ""
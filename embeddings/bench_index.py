@@ -0,0 +1,97 @@
+"""Recall@k and latency of the compact index written by build_faiss.py --index, against the exact one.
+
+    python embeddings/bench_index.py --k 10 --queries 500 --sweep 4,8,16,32,64
+    python embeddings/bench_index.py --questions questions.txt     # embed real questions instead
+
+By default the queries are stored vectors with a little noise added, so no API calls are made.
+--sweep tries several nprobe (IVF) / efSearch (HNSW) values; the one in index_config.json is
+what services.py uses unless FAISS_NPROBE / FAISS_EF_SEARCH override it.
+"""
+import os
+import sys
+import time
+import argparse
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.app.retrieval.faiss_store import read_index_config, apply_search_params
+from backend.app.retrieval.store_versions import resolve_store_path
+
+
+def sample_queries(index, count, noise=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    positions = rng.choice(index.ntotal, min(count, index.ntotal), replace=False)
+    queries = np.stack([index.reconstruct(int(i)) for i in positions])
+    queries += rng.normal(0, noise, queries.shape).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def embed_questions(path):
+    from dotenv import load_dotenv
+    from langchain_openai import OpenAIEmbeddings
+
+    load_dotenv()
+    with open(path, encoding="utf8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    model = OpenAIEmbeddings(model="text-embedding-3-small", openai_api_key=os.getenv("OPENAI_API_KEY"))
+    return np.asarray(model.embed_documents(questions), dtype=np.float32)
+
+
+def run(index, queries, k):
+    """Top-k ids per query, searched one at a time like the API does, plus per-query latencies (ms)."""
+    ids, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, found = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(found[0])
+    return np.stack(ids), np.asarray(latencies)
+
+
+def recall(approx, exact, k):
+    return float(np.mean([len(set(a[:k]) & set(e[:k])) / k for a, e in zip(approx, exact)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compact FAISS index against the exact one.")
+    parser.add_argument("--store", default=os.getenv("VECTOR_STORE_PATH", "data/law_vector_store"))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500, help="sampled queries (ignored with --questions)")
+    parser.add_argument("--questions", help="text file of real questions to embed, one per line")
+    parser.add_argument("--sweep", default="", help="comma-separated nprobe/efSearch values to try")
+    args = parser.parse_args()
+    args.store, _ = resolve_store_path(args.store)
+
+    config = read_index_config(args.store)
+    if not config:
+        print(f"❌ {args.store} has no compact index; build one with build_faiss.py --index ...")
+        return
+
+    exact = faiss.read_index(os.path.join(args.store, "index.faiss"))
+    compact = faiss.read_index(os.path.join(args.store, config["file"]))
+    queries = embed_questions(args.questions) if args.questions else sample_queries(exact, args.queries)
+    print(f"📘 {config['factory']} vs exact: {exact.ntotal} vectors, {len(queries)} queries, k={args.k}")
+
+    exact_ids, exact_ms = run(exact, queries, args.k)
+    exact_size = os.path.getsize(os.path.join(args.store, "index.faiss"))
+    compact_size = os.path.getsize(os.path.join(args.store, config["file"]))
+    print(f"{'exact':>22}  recall@{args.k} 1.000  p50 {np.percentile(exact_ms, 50):6.2f}ms  "
+          f"p95 {np.percentile(exact_ms, 95):6.2f}ms  {exact_size / 1e6:8.1f}MB")
+
+    param = next(iter(config.get("search_params", {})), None)
+    settings = [dict(config.get("search_params", {}))]
+    if param and args.sweep:
+        settings += [{param: int(v)} for v in args.sweep.split(",") if v]
+    for params in settings:
+        apply_search_params(compact, params)
+        ids, ms = run(compact, queries, args.k)
+        label = ", ".join(f"{name}={value}" for name, value in params.items()) or config["kind"]
+        print(f"{label:>22}  recall@{args.k} {recall(ids, exact_ids, args.k):.3f}  p50 {np.percentile(ms, 50):6.2f}ms  "
+              f"p95 {np.percentile(ms, 95):6.2f}ms  {compact_size / 1e6:8.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
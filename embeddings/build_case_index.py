@@ -0,0 +1,69 @@
+import os
+import json
+from dotenv import load_dotenv
+from langchain_community.vectorstores import FAISS
+from langchain_openai import OpenAIEmbeddings
+from langchain.docstore.document import Document
+
+# Load API key
+load_dotenv()
+api_key = os.getenv("OPENAI_API_KEY")
+if not api_key:
+    raise EnvironmentError("❌ Missing OPENAI_API_KEY in .env")
+
+# Config
+CASES_PATH = "data/cases.jsonl"
+CASE_INDEX_PATH = os.getenv("CASE_INDEX_PATH", "data/case_vector_store")
+BATCH_SIZE = 500
+
+# Must match CASE_EMBEDDING_MODEL in backend/app/virtual/case_index.py
+embedding_model = OpenAIEmbeddings(
+    model="text-embedding-3-small",
+    openai_api_key=api_key
+)
+
+
+def summary_to_text(summary):
+    """Flatten a summaryOfCase record into the text that gets embedded."""
+    if isinstance(summary, str):
+        return summary
+    parts = []
+    for key in ("type", "location", "Name_Of_Court", "facts", "saudi_laws", "summary"):
+        value = summary.get(key)
+        if not value:
+            continue
+        if isinstance(value, list):
+            value = "\n".join(str(v) for v in value)
+        parts.append(str(value))
+    return "\n".join(parts)
+
+
+# Load case summaries (whole_case is not needed for the index)
+docs = []
+with open(CASES_PATH, encoding="utf8") as f:
+    for line in f:
+        if line.strip() == "":
+            continue
+        rec = json.loads(line)
+        text = summary_to_text(rec["summaryOfCase"])
+        if not text:
+            continue
+        docs.append(Document(page_content=text, metadata={"case_id": str(rec["case_id"])}))
+
+if not docs:
+    raise ValueError("❌ No case summaries found to embed.")
+
+print(f"🧠 Prepared {len(docs)} case summaries. Generating embeddings...")
+
+all_vectors = None
+for i in range(0, len(docs), BATCH_SIZE):
+    doc_batch = docs[i:i + BATCH_SIZE]
+    print(f"→ Embedding batch {i // BATCH_SIZE + 1} ({len(doc_batch)} cases)...")
+    partial_vector = FAISS.from_documents(doc_batch, embedding_model)
+    if all_vectors is None:
+        all_vectors = partial_vector
+    else:
+        all_vectors.merge_from(partial_vector)
+
+all_vectors.save_local(CASE_INDEX_PATH)
+print(f"✅ Case index saved to {CASE_INDEX_PATH}")
@@ -1,11 +1,58 @@
+"""Build or incrementally update the FAISS law store from data/laws_index.jsonl.
+
+Every chunk gets a content-hashed id (text + metadata). The ids of the current store are kept in
+manifest.json next to it, so a rebuild only embeds chunks that are new, deletes the vectors of
+chunks that disappeared, and leaves the rest untouched. Vectors are also cached on disk by text
+(embedding_store.py) as soon as each batch finishes, so even a full rebuild only pays for text it
+has never seen, and an interrupted build resumes where it stopped.
+
+Laws are chunked across a process pool; embedding batches run concurrently under the
+EMBED_RPM_LIMIT / EMBED_TPM_LIMIT rate limiter.
+
+    python embeddings/build_faiss.py           # incremental
+    python embeddings/build_faiss.py --full    # rebuild the store from scratch (still uses the cache)
+    python embeddings/build_faiss.py --index ivfpq --nlist 1024 --nprobe 16
+
+--index writes a compact approximate index next to the exact one (see
+backend/app/retrieval/faiss_store.py); compare it with embeddings/bench_index.py. The docstore is
+also written in the memory-mappable form the API workers share (retrieval/mmap_docstore.py).
+
+Every build that changes something is written to a new VECTOR_STORE_PATH/versions/<version>
+directory and published by atomically repointing CURRENT, which the running API picks up without a
+restart (backend/app/retrieval/store_versions.py). Files an update does not rewrite are hard-linked
+from the live version, and a run with nothing to change creates no version at all.
+"""
 import os
+import sys
 import json
+import time
+import math
+import shutil
+import filecmp
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
 
+from embedding_store import EmbeddingStore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.app.tokens import count_tokens
+from backend.app.virtual.throttle import RateLimiter
+from backend.app.retrieval.bm25 import BM25Index, BM25_FILE
+from backend.app.retrieval.article_index import ArticleIndex, ARTICLES_FILE
+from backend.app.retrieval.faiss_store import INDEX_CONFIG_FILE, read_index_config
+from backend.app.retrieval.filters import LAW_CATALOG_FILE
+from backend.app.retrieval.mmap_docstore import DOCSTORE_IDS_FILE, write_mmap_docstore
+from backend.app.retrieval.store_versions import (
+    CURRENT_FILE, VERSIONS_DIR, resolve_store_path, new_version, version_path, publish_version, prune_versions,
+)
+from scrapers.law_index import LAW_INDEX_PATH, iter_laws, law_index_paths
+
 # Load API key
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
@@ -13,15 +60,28 @@ if not api_key:
     raise EnvironmentError("❌ Missing OPENAI_API_KEY in .env")
 
 # Config
-LAWS_INDEX_PATH = "data/laws_index.json"
-VECTOR_DB_PATH = "data/law_vector_store"
+LAWS_INDEX_PATH = LAW_INDEX_PATH
+VECTOR_DB_PATH = os.getenv("VECTOR_STORE_PATH", "data/law_vector_store")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite3")
+MANIFEST_NAME = "manifest.json"
+EMBEDDING_MODEL = "text-embedding-3-small"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
-MAX_CHUNK_LENGTH = 4000 
+MAX_CHUNK_LENGTH = 4000
+BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "500"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+# text-embedding-3-small limits for the account (0 = unlimited)
+EMBED_RPM_LIMIT = int(os.getenv("EMBED_RPM_LIMIT", "3000"))
+EMBED_TPM_LIMIT = int(os.getenv("EMBED_TPM_LIMIT", "1000000"))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "0")) or os.cpu_count() or 1
+# Store versions kept under VECTOR_STORE_PATH/versions (the API may still be draining the previous one)
+STORE_KEEP_VERSIONS = int(os.getenv("STORE_KEEP_VERSIONS", "2"))
+# Written by older builds and no longer read (BM25 moved to the memory-mapped bm25.json)
+OBSOLETE_FILES = ("bm25.pkl",)
 
 # Initialize tools
 embedding_model = OpenAIEmbeddings(
-    model="text-embedding-3-small",
+    model=EMBEDDING_MODEL,
     openai_api_key=api_key
 )
 splitter = RecursiveCharacterTextSplitter(
@@ -29,18 +89,43 @@ splitter = RecursiveCharacterTextSplitter(
     chunk_overlap=CHUNK_OVERLAP
 )
 
-# Load laws data
-with open(LAWS_INDEX_PATH, encoding="utf8") as f:
-    db = json.load(f)
+# Approximate index written for services.py (flat = serve the exact index); overridable with --index
+INDEX_KIND = os.getenv("FAISS_INDEX_KIND", "flat")
+INDEX_FACTORIES = {
+    "hnsw": "HNSW{hnsw_m}",
+    "hnsw_sq8": "HNSW{hnsw_m}_SQ8",
+    "ivf": "IVF{nlist},Flat",
+    "ivf_sq8": "IVF{nlist},SQ8",
+    "ivfpq": "IVF{nlist},PQ{pq_m}x{pq_bits}",
+    "sq8": "SQ8",
+}
 
-docs = []
-for law in db["laws"]:
+# A store built with different settings cannot be updated in place
+BUILD_CONFIG = {
+    "embedding_model": EMBEDDING_MODEL,
+    "chunk_size": CHUNK_SIZE,
+    "chunk_overlap": CHUNK_OVERLAP,
+    "max_chunk_length": MAX_CHUNK_LENGTH,
+}
+
+
+def chunk_id(doc):
+    payload = json.dumps([doc.page_content, doc.metadata], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf8")).hexdigest()
+
+
+def _split(text, metadata):
+    return [c for c in splitter.create_documents([text], metadatas=[metadata]) if len(c.page_content) < MAX_CHUNK_LENGTH]
+
+
+def law_chunks(law):
+    """Article and amendment chunks of one law, as (chunk id, Document) pairs."""
+    chunks = []
     for article in law.get("articles", []):
         content = article.get("content", "")
         if not content:
             continue
 
-        
         metadata = {
             "law_id": law["law_id"],
             "law_name": law["name"],
@@ -48,16 +133,11 @@ for law in db["laws"]:
             "part": article.get("part"),
             "url": law["url"]
         }
+        docs = _split(content, metadata)
 
-        chunks = splitter.create_documents([content], metadatas=[metadata])
-        for chunk in chunks:
-            if len(chunk.page_content) < MAX_CHUNK_LENGTH:
-                docs.append(chunk)
-
-        
         for amendment in article.get("amendments", []) or []:
             amend_text = amendment.get("text", "")
-            amend_url = amendment.get("source_url", law["url"]) 
+            amend_url = amendment.get("source_url", law["url"])
 
             amend_metadata = {
                 "law_id": law["law_id"],
@@ -65,35 +145,336 @@ for law in db["laws"]:
                 "article_title": article.get("title", ""),
                 "part": article.get("part"),
                 "url": amend_url,
-                "is_amendment": True 
+                "is_amendment": True
             }
+            docs += _split(amend_text, amend_metadata)
+
+        chunks += [(chunk_id(doc), doc) for doc in docs]
+    return chunks
+
+
+def load_chunks(path=LAWS_INDEX_PATH, workers=CHUNK_WORKERS):
+    """{chunk id: Document} for every article and amendment chunk in the laws index.
+
+    Laws are streamed from the index (or its shards) with only a few per worker in flight, so
+    the raw records never sit in memory all at once; the chunks themselves (the whole corpus,
+    split) are all returned, since the manifest diff, BM25 and a full rebuild need them together.
+    """
+    paths = law_index_paths(path)
+    if not paths:
+        raise FileNotFoundError(f"❌ No law index at {path}; run scrapers/scrape_and_save.py first.")
+
+    chunks = {}
+    laws = iter_laws(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        while True:
+            for law in laws:
+                pending.add(pool.submit(law_chunks, law))
+                if len(pending) >= 4 * workers:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunks.update(future.result())
+    return chunks
+
+
+def load_manifest(store_path):
+    path = os.path.join(store_path, MANIFEST_NAME)
+    if not os.path.exists(path) or not os.path.exists(os.path.join(store_path, "index.faiss")):
+        return None
+    with open(path, encoding="utf8") as f:
+        manifest = json.load(f)
+    return manifest if manifest.get("config") == BUILD_CONFIG else None
+
+
+def save_manifest(store_path, chunks):
+    manifest = {"config": BUILD_CONFIG, "chunks": {cid: doc.metadata["law_id"] for cid, doc in chunks.items()}}
+    with open(os.path.join(store_path, MANIFEST_NAME), "w", encoding="utf8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+def save_bm25(store_path, chunks):
+    """BM25 index over the same chunk ids as the FAISS docstore, for hybrid retrieval in services.py."""
+    index = BM25Index.build(
+        (cid, f"{doc.metadata['law_name']} {doc.metadata['article_title']}\n{doc.page_content}")
+        for cid, doc in chunks.items()
+    )
+    index.save(os.path.join(store_path, BM25_FILE))
+    print(f"🔎 BM25 index saved ({len(index.terms)} terms)")
+
+
+def save_articles(store_path):
+    """(law name, article number) index for the direct article lookup in services.py, and the
+    law catalog (name, category) behind its retrieval filters."""
+    catalog = {}
+
+    def laws():
+        for law in iter_laws(law_index_paths(LAWS_INDEX_PATH)):
+            catalog[law["law_id"]] = {"name": law["name"], "category": law.get("category")}
+            yield law
+
+    index = ArticleIndex.build(laws())
+    index.save(os.path.join(store_path, ARTICLES_FILE))
+    with open(os.path.join(store_path, LAW_CATALOG_FILE), "w", encoding="utf8") as f:
+        json.dump(catalog, f, ensure_ascii=False)
+    print(f"🔎 Article index saved ({sum(len(law['articles']) for law in index.laws.values())} articles, {len(catalog)} laws)")
+
+
+def index_options_for(kind, hnsw_m=32, ef_construction=200, ef_search=64, nlist=0, nprobe=16, pq_m=64, pq_bits=8):
+    if kind == "flat":
+        return {"kind": "flat"}
+    return {
+        "kind": kind, "hnsw_m": hnsw_m, "ef_construction": ef_construction, "ef_search": ef_search,
+        "nlist": nlist, "nprobe": nprobe, "pq_m": pq_m, "pq_bits": pq_bits,
+    }
+
+
+def save_compact_index(store_path, store, options):
+    """Write the approximate index chosen by options["kind"] (or drop it for "flat") plus index_config.json.
+
+    Vectors are copied from the exact index in position order, so the compact index lines up
+    with the same pickled docstore and index_to_docstore_id.
+    """
+    import faiss
+    import numpy as np
+
+    config_path = os.path.join(store_path, INDEX_CONFIG_FILE)
+    old = read_index_config(store_path)
+    if old and old.get("file") and os.path.exists(os.path.join(store_path, old["file"])):
+        os.remove(os.path.join(store_path, old["file"]))
+    if options["kind"] == "flat":
+        if os.path.exists(config_path):
+            os.remove(config_path)
+        return
+
+    started = time.perf_counter()
+    n, d = store.index.ntotal, store.index.d
+    vectors = store.index.reconstruct_n(0, n)
+    nlist = options["nlist"] or max(1, int(4 * math.sqrt(n)))
+    factory = INDEX_FACTORIES[options["kind"]].format(**{**options, "nlist": nlist})
+    index = faiss.index_factory(d, factory, faiss.METRIC_L2)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = options["ef_construction"]
+    if not index.is_trained:
+        # ~256 points per centroid is plenty for k-means and keeps training fast
+        sample = vectors[np.random.default_rng(0).choice(n, min(n, 256 * nlist), replace=False)]
+        index.train(sample)
+    index.add(vectors)
+
+    kind = options["kind"]
+    filename = f"index.{kind}.faiss"
+    faiss.write_index(index, os.path.join(store_path, filename))
+    search_params = {"efSearch": options["ef_search"]} if kind.startswith("hnsw") else {"nprobe": options["nprobe"]} if kind.startswith("ivf") else {}
+    config = {"kind": kind, "factory": factory, "file": filename, "ntotal": n, "search_params": search_params, "options": options}
+    with open(config_path, "w", encoding="utf8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+    size = os.path.getsize(os.path.join(store_path, filename))
+    print(f"🗜️ {factory} index saved ({size / 1e6:.1f}MB vs {n * d * 4 / 1e6:.1f}MB exact) in {time.perf_counter() - started:.1f}s")
+
+
+def embed_texts(texts, cache, concurrency=EMBED_CONCURRENCY):
+    """Vectors for `texts`, embedding only the ones missing from the on-disk cache.
+
+    Batches run on `concurrency` threads; each finished batch is written to the cache right
+    away. Returns (vectors, number of texts sent to the API, tokens sent).
+    """
+    vectors = cache.get_many(texts)
+    missing = list(dict.fromkeys(t for t in texts if t not in vectors))
+    batches = [missing[i:i + BATCH_SIZE] for i in range(0, len(missing), BATCH_SIZE)]
+    limiter = RateLimiter(EMBED_RPM_LIMIT, EMBED_TPM_LIMIT)
+    total_tokens = 0
+
+    def embed_batch(batch):
+        tokens = sum(count_tokens(t, EMBEDDING_MODEL) for t in batch)
+        limiter.acquire(tokens)
+        return embedding_model.embed_documents(batch), tokens
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches) or 1))) as pool:
+        futures = {pool.submit(embed_batch, batch): batch for batch in batches}
+        for done, future in enumerate(as_completed(futures), 1):
+            batch = futures[future]
+            try:
+                batch_vectors, tokens = future.result()
+            except Exception:
+                for f in futures:
+                    f.cancel()
+                print(f"❌ Embedding failed after {done - 1}/{len(batches)} batches; rerun to resume from the cache.")
+                raise
+            cache.put_many(batch, batch_vectors)
+            vectors.update(zip(batch, batch_vectors))
+            total_tokens += tokens
+            print(f"→ Embedded batch {done}/{len(batches)} ({len(batch)} chunks)")
+    return [vectors[t] for t in texts], len(missing), total_tokens
+
+
+def stage_version():
+    """A new, empty version directory."""
+    version = new_version(VECTOR_DB_PATH)
+    target = version_path(VECTOR_DB_PATH, version)
+    os.makedirs(target)
+    return version, target
+
+
+def store_files(path):
+    return [n for n in os.listdir(path)
+            if n not in (VERSIONS_DIR, CURRENT_FILE) and not n.startswith(".") and not n.endswith(".tmp")
+            and os.path.isfile(os.path.join(path, n))]
+
+
+def link_unchanged(base, target, skip=()):
+    """Hard-link the files of `base` that `target` does not have yet (copy where links are not supported).
+
+    Only call this once `target` is fully written: faiss and pickle rewrite files in place, so a
+    write through a link would corrupt the live version. Published versions are never written to.
+    """
+    for name in store_files(base):
+        if name in skip or name in OBSOLETE_FILES or os.path.exists(os.path.join(target, name)):
+            continue
+        try:
+            os.link(os.path.join(base, name), os.path.join(target, name))
+        except OSError:
+            shutil.copy2(os.path.join(base, name), os.path.join(target, name))
+
+
+def same_files(base, target):
+    names = store_files(target)
+    _, mismatch, errors = filecmp.cmpfiles(base, target, names, shallow=False)
+    return not mismatch and not errors
+
+
+def retire_legacy_store(target):
+    """Delete the store files left at the top of VECTOR_STORE_PATH by builds before versioning,
+    once version `target` has replaced them (a worker still serving them keeps its open files)."""
+    for name in {*store_files(target), *OBSOLETE_FILES}:
+        path = os.path.join(VECTOR_DB_PATH, name)
+        if os.path.isfile(path):
+            os.remove(path)
+    print(f"🧹 Removed the unversioned store files from {VECTOR_DB_PATH}")
+
+
+def publish(version, legacy=False):
+    publish_version(VECTOR_DB_PATH, version)
+    if legacy:
+        retire_legacy_store(version_path(VECTOR_DB_PATH, version))
+    removed = prune_versions(VECTOR_DB_PATH, STORE_KEEP_VERSIONS)
+    print(f"📌 Published store version {version}" + (f" (pruned {', '.join(removed)})" if removed else ""))
+
+
+def build(full=False, index_options=None):
+    """index_options=None keeps the index kind the store already has (FAISS_INDEX_KIND for a new store)."""
+    started = time.perf_counter()
+    base, base_version = resolve_store_path(VECTOR_DB_PATH)
+    if not os.path.exists(os.path.join(base, "index.faiss")):
+        base = None
+    legacy = base is not None and base_version is None
+    current_options = (read_index_config(base) or {}).get("options") if base else None
+    if index_options is None:
+        index_options = current_options or index_options_for(INDEX_KIND)
+    chunks = load_chunks()
+    chunked = time.perf_counter()
+    if not chunks:
+        raise ValueError("❌ No valid chunks found to embed.")
+
+    manifest = None if full or base is None else load_manifest(base)
+    old_ids = set(manifest["chunks"]) if manifest else set()
+    added = [cid for cid in chunks if cid not in old_ids]
+    removed = [cid for cid in old_ids if cid not in chunks]
+    print(f"🧠 Prepared {len(chunks)} chunks: {len(added)} new, {len(removed)} removed, "
+          f"{len(chunks) - len(added)} unchanged.")
+
+    version, target = stage_version()
+    try:
+        if manifest and not added and not removed:
+            # Only what is missing or out of date is written; every other file is linked from the live version
+            save_articles(target)   # cheap, and article titles can change without changing any chunk
+            rewrite_index = (current_options or {"kind": "flat"}) != index_options
+            missing_bm25 = not os.path.exists(os.path.join(base, BM25_FILE))
+            missing_docstore = not os.path.exists(os.path.join(base, DOCSTORE_IDS_FILE))
+            if not (rewrite_index or missing_bm25 or missing_docstore) and same_files(base, target):
+                shutil.rmtree(target)
+                print(f"✅ FAISS vector store at {base} is up to date")
+                return
+            if missing_bm25:
+                save_bm25(target, chunks)
+            skip = set()
+            if rewrite_index or missing_docstore:
+                store = FAISS.load_local(base, embedding_model, allow_dangerous_deserialization=True)
+                if rewrite_index:
+                    old_file = (read_index_config(base) or {}).get("file")
+                    skip = {INDEX_CONFIG_FILE, old_file} - {None}
+                    save_compact_index(target, store, index_options)
+                if missing_docstore:
+                    write_mmap_docstore(target, store)
+            link_unchanged(base, target, skip)
+            publish(version, legacy)
+            return
+
+        cache = EmbeddingStore(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL)
+        try:
+            texts = [chunks[cid].page_content for cid in added]
+            vectors, embedded, tokens = embed_texts(texts, cache)
+        finally:
+            cache.close()
+        embedded_at = time.perf_counter()
 
-            amend_chunks = splitter.create_documents([amend_text], metadatas=[amend_metadata])
-            for chunk in amend_chunks:
-                if len(chunk.page_content) < MAX_CHUNK_LENGTH:
-                    docs.append(chunk)
+        text_embeddings = list(zip(texts, vectors))
+        metadatas = [chunks[cid].metadata for cid in added]
+        if manifest:
+            # Every file is rewritten below, so the live version is only read, never copied
+            store = FAISS.load_local(base, embedding_model, allow_dangerous_deserialization=True)
+            if removed:
+                store.delete(removed)
+            if added:
+                store.add_embeddings(text_embeddings, metadatas=metadatas, ids=added)
+        else:
+            store = FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas, ids=added)
 
-if not docs:
-    raise ValueError("❌ No valid chunks found to embed.")
+        store.save_local(target)
+        write_mmap_docstore(target, store)
+        save_compact_index(target, store, index_options)
+        save_bm25(target, chunks)
+        save_articles(target)
+        save_manifest(target, chunks)
+    except BaseException:
+        shutil.rmtree(target, ignore_errors=True)   # never published; the live version is untouched
+        raise
+    publish(version, legacy)
+    finished = time.perf_counter()
 
-print(f"🧠 Prepared {len(docs)} chunks . Generating embeddings...")
+    if manifest:
+        changed_laws = {chunks[cid].metadata["law_id"] for cid in added} | {manifest["chunks"][cid] for cid in removed}
+        print(f"📝 Laws changed: {', '.join(sorted(str(law_id) for law_id in changed_laws))}")
+    print(f"✅ FAISS vector store saved to {target}")
 
+    embed_time = embedded_at - chunked
+    print(f"📊 Chunking: {len(chunks)} chunks in {chunked - started:.1f}s ({CHUNK_WORKERS} processes)")
+    print(f"📊 Embedding: {embedded} chunks / {tokens} tokens in {embed_time:.1f}s "
+          f"({embedded / embed_time if embed_time else 0:.0f} chunks/s, {tokens / embed_time if embed_time else 0:.0f} tokens/s), "
+          f"{len(texts) - embedded} from cache")
+    print(f"📊 Index + BM25 + save: {finished - embedded_at:.1f}s, total {finished - started:.1f}s")
 
-def batch_chunks(lst, batch_size):
-    for i in range(0, len(lst), batch_size):
-        yield lst[i:i + batch_size]
 
-print("🧠 Generating embeddings in safe batches...")
-all_vectors = None
+def main():
+    parser = argparse.ArgumentParser(description="Build or incrementally update the FAISS law store.")
+    parser.add_argument("--full", action="store_true", help="ignore the existing store and rebuild it from scratch")
+    parser.add_argument("--index", choices=["flat", *INDEX_FACTORIES], help="index served by the API (default: keep the current one)")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW neighbours per node")
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef-search", type=int, default=64, help="default HNSW search depth (FAISS_EF_SEARCH overrides)")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF cells (0 = 4·sqrt(n))")
+    parser.add_argument("--nprobe", type=int, default=16, help="default IVF cells searched (FAISS_NPROBE overrides)")
+    parser.add_argument("--pq-m", type=int, default=64, help="PQ sub-quantizers (must divide the dimension)")
+    parser.add_argument("--pq-bits", type=int, default=8)
+    args = parser.parse_args()
+    index_options = index_options_for(
+        args.index, args.hnsw_m, args.ef_construction, args.ef_search, args.nlist, args.nprobe, args.pq_m, args.pq_bits,
+    ) if args.index else None
+    build(full=args.full, index_options=index_options)
 
-for i, doc_batch in enumerate(batch_chunks(docs, 500)):
-    print(f"→ Embedding batch {i + 1} ({len(doc_batch)} docs)...")
-    partial_vector = FAISS.from_documents(doc_batch, embedding_model)
-    if all_vectors is None:
-        all_vectors = partial_vector
-    else:
-        all_vectors.merge_from(partial_vector)
 
-all_vectors.save_local(VECTOR_DB_PATH)
-print(f"✅ FAISS vector store saved to {VECTOR_DB_PATH}")
-print(f"✅ FAISS vector store saved to {VECTOR_DB_PATH}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
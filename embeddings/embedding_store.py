@@ -0,0 +1,52 @@
+"""On-disk embedding cache for the index builders.
+
+Vectors are keyed by sha256(model, text), so an unchanged chunk is never sent to the embeddings
+API twice, whichever law or rebuild it comes from.
+"""
+import os
+import hashlib
+import sqlite3
+
+import numpy as np
+
+
+def text_key(model, text):
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf8")).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, path, model):
+        self.path = path
+        self.model = model
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, texts):
+        """{text: vector} for the texts already cached."""
+        keys = {text_key(self.model, t): t for t in texts}
+        found = {}
+        key_list = list(keys)
+        for i in range(0, len(key_list), 500):
+            part = key_list[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+            )
+            for key, blob in rows:
+                found[keys[key]] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, texts, vectors):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            [(text_key(self.model, t), np.asarray(v, dtype=np.float32).tobytes()) for t, v in zip(texts, vectors)],
+        )
+        self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
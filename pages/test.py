@@ -1,8 +1,9 @@
 import streamlit as st
 import sys
 import os
+import asyncio
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from backend.app.virtual.openSdk import load_database, find_matching_cases, generate_final_judgment, agent_phase1, agent_phase2
+from backend.app.virtual.openSdk import load_database, stream_matching_cases, stream_final_judgment, agent_phase1, agent_phase2
 
 # ----------------------------
 #  Initialize Phase 1 & Phase 2 Models
@@ -13,6 +14,33 @@ def init_model():
         "phase2": {"system": agent_phase2}
     }
 
+# ----------------------------
+#  Drive the async streaming pipeline from Streamlit's synchronous script run
+# ----------------------------
+def iterate_async(agen):
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.close()
+
+
+def matches_markdown(matched_cases):
+    lines = []
+    for case in matched_cases:
+        lines.append(f"- 🆔 **الرقم التسلسلي:** {case.get('case_id', 'N/A')}")
+        lines.append(f"  - 🔹 اوجة التشابه: {case.get('PointOfSimilarity', 'N/A')}")
+    return "\n".join(lines)
+
+
+def judgment_html(judgment_text):
+    return f"<div style='direction: rtl; font-size: 16px; line-height: 1.5; text-align: justify; margin-top: 1em;'>{judgment_text}</div>"
+
 # ----------------------------
 #  Custom CSS for Dark Mode and Gradients
 # ----------------------------
@@ -99,42 +127,61 @@ def app():
             database = load_database()
 
             # ----------------------------
-            #  Search for Similar Cases
+            #  Search for Similar Cases (matches are shown as each batch completes)
             # ----------------------------
+            with st.expander("🔍 القضايا المتشابهة", expanded=True):
+                matches_area = st.empty()
+            progress_bar = st.progress(0.0)
+            by_batch = {}
             with st.spinner("🔄 البحث عن قضايا مشابهة..."):
-                matched_cases = find_matching_cases(model["phase1"], database, case_input_text)
-
-            with st.expander("🔍 القضايا المتشابهة"):
-                if matched_cases:
-                    for case in matched_cases:
-                        st.markdown(f"- 🆔 **الرقم التسلسلي:** {case.get('case_id', 'N/A')}")
-                        st.markdown(f"  - 🔹 اوجة التشابه: {case.get('PointOfSimilarity', 'N/A')}")
-                else:
-                    st.info("لا توجد قضايا مشابهة.")
+                for result in iterate_async(stream_matching_cases(model["phase1"], database, case_input_text)):
+                    if "batch" not in result:
+                        if result["skipped_batches"]:
+                            st.caption(f"⏩ تم تخطي {result['skipped_batches']} من {result['total_batches']} دفعات بعد العثور على نتائج كافية")
+                        continue
+                    by_batch[result["batch"]] = result["matches"]
+                    progress_bar.progress(len(by_batch) / result["total_batches"])
+                    matched_cases = [case for i in sorted(by_batch) for case in by_batch[i]]
+                    if matched_cases:
+                        matches_area.markdown(matches_markdown(matched_cases))
+            progress_bar.empty()
+
+            matched_cases = [case for i in sorted(by_batch) for case in by_batch[i]]
+            if not matched_cases:
+                matches_area.info("لا توجد قضايا مشابهة.")
 
             # ----------------------------
-            #  Generate Final Judgment based on Similar Cases
+            #  Generate Final Judgment based on Similar Cases (rendered as it is written)
             # ----------------------------
+            with st.expander("📚 نظرة عامة", expanded=True):
+                overview_area = st.empty()
+            with st.expander("🧠 أساس الحكم", expanded=True):
+                source_area = st.empty()
+            with st.expander("📖 الحكم النهائي", expanded=True):
+                judgment_area = st.empty()
+
+            judgment = None
             with st.spinner("⏳ انشاء الحكم النهائي..."):
                 case_input = {"description": case_input_text.strip()}
-                judgment = generate_final_judgment(model["phase2"], case_input, matched_cases)
+                try:
+                    for judgment in iterate_async(stream_final_judgment(model["phase2"], case_input, matched_cases)):
+                        overview_area.markdown("\n".join(
+                            f"- 🆔 **الرقم التسلسلي:** {scase.get('case_id', 'N/A')}\n  - 📝 نبذة: {scase.get('summary', '')}"
+                            for scase in judgment.get("similar_cases", []) if isinstance(scase, dict)
+                        ))
+                        if judgment.get("Source"):
+                            source_area.markdown(judgment["Source"])
+                        if judgment.get("predicted_judgment"):
+                            judgment_area.markdown(judgment_html(judgment["predicted_judgment"]), unsafe_allow_html=True)
+                except Exception as e:
+                    print("Error judgment:", e)
+                    judgment = None
 
             if judgment:
-                with st.expander("📚 نظرة عامة"):
-                    for scase in judgment.get("similar_cases", []):
-                        st.markdown(f"- 🆔 **الرقم التسلسلي:** {scase.get('case_id', 'N/A')}")
-                        st.markdown(f"  - 📝 نبذة: {scase.get('summary', '')}")
-
-                with st.expander("🧠 أساس الحكم"):
-                    st.markdown(judgment.get("Source", "No explanation available."))
-
-                with st.expander("📖 الحكم النهائي"):
-                    judgment_text = judgment.get("predicted_judgment", "No judgment generated.")
-                    st.markdown(
-                        f"<div style='direction: rtl; font-size: 16px; line-height: 1.5; text-align: justify; margin-top: 1em;'>{judgment_text}</div>",
-                        unsafe_allow_html=True
-                    )
-
+                if not judgment.get("Source"):
+                    source_area.markdown("No explanation available.")
+                if not judgment.get("predicted_judgment"):
+                    judgment_area.markdown(judgment_html("No judgment generated."), unsafe_allow_html=True)
             else:
                 st.error("❌ Failed to generate judgment. Please check your internet connection and API key.")
 
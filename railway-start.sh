@@ -12,8 +12,8 @@ else
     echo "⚠️  Not running on Railway"
 fi
 
-# Check if vector store exists
-if [ ! -d "/app/data/law_vector_store" ]; then
+# Check if vector store exists (an interrupted build never publishes CURRENT and resumes from the embedding cache)
+if [ ! -f "/app/data/law_vector_store/index.faiss" ] && [ ! -f "/app/data/law_vector_store/CURRENT" ]; then
     echo "📊 Building FAISS vector store..."
     echo "🔑 Checking OpenAI API key..."
     
@@ -24,8 +24,8 @@ if [ ! -d "/app/data/law_vector_store" ]; then
     fi
     
     echo "✅ OpenAI API key found, building vector store..."
-    cd /app/embeddings
-    python build_faiss.py
+    cd /app
+    python embeddings/build_faiss.py
     
     if [ $? -eq 0 ]; then
         echo "✅ Vector store created successfully!"
@@ -33,8 +33,6 @@ if [ ! -d "/app/data/law_vector_store" ]; then
         echo "❌ Failed to create vector store!"
         exit 1
     fi
-    
-    cd /app
 else
     echo "✅ Vector store already exists!"
 fi
@@ -45,7 +43,8 @@ ls -la /app/data/
 echo "📊 Vector store size:"
 du -sh /app/data/law_vector_store/ 2>/dev/null || echo "Vector store not found"
 
-# Start the FastAPI server
-echo "🚀 Starting FastAPI server on port $PORT..."
+# Start the FastAPI server; the store and models load in the background and /ready (railway.json's
+# healthcheck path) answers 503 until they are done, so traffic waits for the warm-up
+echo "🚀 Starting FastAPI server on port $PORT (healthcheck: /ready)..."
 cd /app
 python -m uvicorn backend.app.main:app --host 0.0.0.0 --port $PORT
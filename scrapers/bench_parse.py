@@ -0,0 +1,74 @@
+"""Benchmark the law-page parser over the pages saved in data/html_cache.
+
+Times the per-article soup.find amendment lookup (the old parser) against the indexed lookup
+in parse_articles, for every available HTML backend, and checks that each variant returns the
+same articles and metadata as the old parser on html.parser. Only switch the scraper to lxml
+(SCRAPE_HTML_PARSER=lxml) when it reports "identical" for lxml.
+
+    python scrapers/bench_parse.py [--limit 20] [--repeat 3]
+"""
+from __future__ import annotations
+import argparse, pathlib, time
+
+from scrape_and_save import HTML_CACHE_DIR, extract_metadata, make_soup, parse_articles
+
+
+class _ScanIndex:
+    # The previous lookup: soup.find rescans the whole page for every amended article
+    def __init__(self, soup):
+        self.soup = soup
+
+    def get(self, key):
+        return self.soup.find("div", class_=key)
+
+
+def parse_articles_scan(soup):
+    return parse_articles(soup, _ScanIndex(soup))
+
+
+def available_parsers():
+    parsers = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        parsers.append("lxml")
+    except ImportError:
+        pass
+    return parsers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BOE law-page parsing over cached pages.")
+    parser.add_argument("--cache", default=HTML_CACHE_DIR)
+    parser.add_argument("--limit", type=int, default=0, help="only the N largest pages (0 = all)")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    pages = sorted(pathlib.Path(args.cache).glob("*.html"), key=lambda p: p.stat().st_size, reverse=True)
+    if args.limit:
+        pages = pages[:args.limit]
+    if not pages:
+        print(f"❌ No cached pages in {args.cache}; run scrape_and_save.py first.")
+        return
+    htmls = [p.read_text(encoding="utf8") for p in pages]
+    print(f"📘 {len(htmls)} pages, {sum(len(h) for h in htmls) / 1e6:.1f}M chars")
+
+    reference = []
+    for html in htmls:
+        soup = make_soup(html, "html.parser")
+        reference.append((parse_articles_scan(soup), extract_metadata(soup)))
+
+    for backend in available_parsers():
+        for name, parse in (("scan", parse_articles_scan), ("indexed", parse_articles)):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                results = []
+                for html in htmls:
+                    soup = make_soup(html, backend)
+                    results.append((parse(soup), extract_metadata(soup)))
+            elapsed = (time.perf_counter() - start) / args.repeat
+            same = "identical" if results == reference else "⚠️ DIFFERENT output"
+            print(f"{backend:12} {name:8} {elapsed:7.2f}s  ({len(htmls) / elapsed:.1f} pages/s)  {same}")
+
+
+if __name__ == "__main__":
+    main()
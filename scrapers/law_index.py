@@ -0,0 +1,117 @@
+"""Streaming law index: one JSON law record per line.
+
+scrape_and_save.py appends each law as soon as it is scraped (to "<path>.partial", renamed
+over <path> when the run completes), so the scraper never holds the whole corpus in memory.
+embeddings/build_faiss.py streams the records back one at a time, so it never holds the raw
+records all at once, but it still keeps every chunk (load_chunks) and every article
+(save_articles) while it builds the store. A scrape can also be split into shards
+(laws_index.2-of-4.jsonl), which readers pick up when the unsharded file is absent.
+"""
+from __future__ import annotations
+import os, glob, json
+from typing import Iterable, Iterator, Optional
+
+LAW_INDEX_PATH = "data/laws_index.jsonl"
+# The monolithic format written before the JSONL index; still readable
+LEGACY_INDEX_PATH = "data/laws_index.json"
+
+
+def shard_path(path: str, shard: int, num_shards: int) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{shard}-of-{num_shards}{ext}"
+
+
+def law_index_paths(path: str = LAW_INDEX_PATH) -> list[str]:
+    """The files holding the index: `path` itself, else its shards, else the legacy JSON file."""
+    if os.path.exists(path):
+        return [path]
+    root, ext = os.path.splitext(path)
+    shards = sorted(glob.glob(f"{root}.*-of-*{ext}"))
+    if shards:
+        return shards
+    return [LEGACY_INDEX_PATH] if os.path.exists(LEGACY_INDEX_PATH) else []
+
+
+def iter_laws(paths: Iterable[str]) -> Iterator[dict]:
+    for path in paths:
+        if path.endswith(".jsonl"):
+            with open(path, encoding="utf8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            with open(path, encoding="utf8") as f:
+                yield from json.load(f)["laws"]
+
+
+def read_law_ids(path: str) -> set:
+    """law_ids already present in a (possibly partial) JSONL index, for resuming."""
+    ids = set()
+    if not os.path.exists(path):
+        return ids
+    with open(path, encoding="utf8") as f:
+        for line in f:
+            try:
+                ids.add(json.loads(line)["law_id"])
+            except (ValueError, KeyError):
+                continue   # a line cut short by a crash; that law is scraped again
+    return ids
+
+
+class LawLookup:
+    """Random access to the law records of existing JSONL files by law_id, through byte offsets."""
+
+    def __init__(self, paths: Iterable[str]):
+        self._offsets: dict[str, tuple[str, int]] = {}
+        for path in paths:
+            if not path.endswith(".jsonl"):
+                continue
+            with open(path, "rb") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        self._offsets[json.loads(line)["law_id"]] = (path, offset)
+                    except (ValueError, KeyError):
+                        pass
+                    offset += len(line)
+
+    def get(self, law_id: str) -> Optional[dict]:
+        if law_id not in self._offsets:
+            return None
+        path, offset = self._offsets[law_id]
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+
+class LawIndexWriter:
+    """Appends law records to "<path>.partial" and moves it over <path> on close()."""
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.partial_path = path + ".partial"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.done = read_law_ids(self.partial_path) if resume else set()
+        if resume:
+            self._drop_torn_line()
+        self._f = open(self.partial_path, "a" if resume else "w", encoding="utf8")
+
+    def _drop_torn_line(self) -> None:
+        # A crash mid-write leaves a line without its newline; cut it so appends start clean
+        if not os.path.exists(self.partial_path):
+            return
+        with open(self.partial_path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def write(self, law: dict) -> None:
+        self._f.write(json.dumps(law, ensure_ascii=False) + "\n")
+        self._f.flush()
+        self.done.add(law["law_id"])
+
+    def close(self, complete: bool = True) -> None:
+        """Publish the index, or with complete=False keep it as .partial for a --resume run."""
+        self._f.close()
+        if complete:
+            os.replace(self.partial_path, self.path)
@@ -1,18 +1,46 @@
 from __future__ import annotations
-import json, pathlib, re
-from datetime import datetime
+import os, re, argparse, importlib.util
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import requests
 from bs4 import BeautifulSoup
-from utils_scrape import SESSION, clean_text  
+from utils_scrape import HostRateLimiter, HtmlCache, fetch_cached
+from law_index import LAW_INDEX_PATH, LawIndexWriter, LawLookup, law_index_paths, shard_path
 
-def fetch_articles(law_id):
-    url = f"https://laws.boe.gov.sa/BoeLaws/Laws/LawDetails/{law_id}/1"
-    response = SESSION.get(url)
-    if not response.ok:
-        print(f"❌ Failed to fetch law: {law_id}")
-        return []
+# BeautifulSoup backend. "lxml" is several times faster on the long statutes; it is opt-in until
+# scrapers/bench_parse.py reports identical articles for it on the cached pages.
+HTML_PARSER = os.getenv("SCRAPE_HTML_PARSER", "html.parser")
+if HTML_PARSER == "lxml" and importlib.util.find_spec("lxml") is None:
+    print("⚠️ SCRAPE_HTML_PARSER=lxml but lxml is not installed; using html.parser")
+    HTML_PARSER = "html.parser"
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+OUT_PATH = LAW_INDEX_PATH
+HTML_CACHE_DIR = "data/html_cache"
+
+
+def law_url(law_id):
+    return f"https://laws.boe.gov.sa/BoeLaws/Laws/LawDetails/{law_id}/1"
+
+
+def make_soup(html, parser=None):
+    return BeautifulSoup(html, parser or HTML_PARSER)
+
+
+def amendment_index(soup):
+    """Popup amendment blocks keyed by their class string ("<article id> popup-list"), built in one pass.
+
+    Matches soup.find("div", class_=...) exactly: the key is the full class attribute and the
+    first block wins.
+    """
+    index = {}
+    for div in soup.find_all("div", class_="popup-list"):
+        index.setdefault(" ".join(div.get("class", [])), div)
+    return index
+
+
+def parse_articles(soup, popups=None):
+    """Articles of a law page; `popups` is the amendment lookup (amendment_index(soup) by default)."""
+    if popups is None:
+        popups = amendment_index(soup)
     articles = []
     current_part = None
 
@@ -33,7 +61,7 @@ def fetch_articles(law_id):
         amend_link = article.find("a", class_="ancArticlePrevVersions")
         if amend_link and amend_link.has_attr("data-articleid"):
             amend_id = amend_link["data-articleid"]
-            amend_div = soup.find("div", class_=f"{amend_id} popup-list")
+            amend_div = popups.get(f"{amend_id} popup-list")
             if amend_div:
                 html_blocks = amend_div.find_all("div", class_="HTMLContainer")
                 for block in html_blocks:
@@ -73,45 +101,106 @@ def extract_metadata(soup):
     return meta
 
 def read_sources(path="data/legal_sources.txt") -> list[dict]:
+    """Sources as {law_id, name, url, category}; a "# category: <name>" line applies to the laws after it."""
     sources = []
+    category = None
     with open(path, encoding="utf8") as f:
         for line in f:
             line = line.strip()
-            if line.startswith("#") or not line:
+            if line.startswith("#"):
+                match = re.match(r"#\s*category\s*:\s*(.+)", line)
+                if match:
+                    category = match.group(1).strip()
+                continue
+            if not line:
                 continue
             url, name = line.split("#")
             law_id = url.split("/")[-2]
             sources.append({
                 "law_id": law_id,
                 "name": name.strip(),
-                "url": url.strip()
+                "url": url.strip(),
+                "category": category
             })
     return sources
 
-def main():
-    sources = read_sources()
-    final_data = []
+def scrape_law(law, cache=None, limiter=None, previous=None):
+    """Fetch a law page once and parse both its metadata and its articles.
 
-    for law in sources:
-        print(f"📘 Fetching: {law['name']}")
-        url = f"https://laws.boe.gov.sa/BoeLaws/Laws/LawDetails/{law['law_id']}/1"
-        r = SESSION.get(url)
-        if not r.ok:
-            print(f"❌ Failed: {law['law_id']}")
-            continue
+    Returns (law record or None on failure, whether the page changed since it was cached).
+    """
+    try:
+        html, changed = fetch_cached(law_url(law["law_id"]), cache, limiter)
+    except requests.RequestException as e:
+        print(f"❌ Failed: {law['law_id']} ({e})")
+        return None, True
 
-        soup = BeautifulSoup(r.text, "html.parser")
-        law["metadata"] = extract_metadata(soup)
-        law["articles"] = fetch_articles(law["law_id"])
-        final_data.append(law)
+    old = previous.get(law["law_id"]) if previous is not None else None
+    if not changed and old is not None and old.get("articles") is not None:
+        return {**law, "metadata": old.get("metadata", {}), "articles": old["articles"]}, False
 
-    out_path = pathlib.Path("data/laws_index.json")
-    out_path.write_text(json.dumps({
-        "generated_at": datetime.now().isoformat(),
-        "laws": final_data
-    }, ensure_ascii=False, indent=2), encoding="utf8")
+    soup = make_soup(html)
+    return {**law, "metadata": extract_metadata(soup), "articles": parse_articles(soup)}, True
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape the BOE laws in data/legal_sources.txt into data/laws_index.jsonl.")
+    parser.add_argument("--workers", type=int, default=4, help="laws fetched concurrently")
+    parser.add_argument("--min-interval", type=float, default=1.0, help="seconds between two requests to the same host")
+    parser.add_argument("--no-cache", action="store_true", help="re-download and re-parse every law")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted run, skipping laws already written")
+    parser.add_argument("--shard", help="scrape only shard I of N (\"I/N\", 1-based) into its own file")
+    args = parser.parse_args()
+
+    sources = read_sources()
+    out_path = OUT_PATH
+    if args.shard:
+        shard, num_shards = (int(x) for x in args.shard.split("/"))
+        sources = sources[shard - 1::num_shards]
+        out_path = shard_path(OUT_PATH, shard, num_shards)
+
+    cache = None if args.no_cache else HtmlCache(HTML_CACHE_DIR)
+    previous = None if args.no_cache else LawLookup([out_path] if args.shard else law_index_paths(OUT_PATH))
+    limiter = HostRateLimiter(args.min_interval)
+    writer = LawIndexWriter(out_path, resume=args.resume)
+    todo = [law for law in sources if law["law_id"] not in writer.done]
+    if writer.done:
+        print(f"⏩ Resuming: {len(writer.done)} laws already written")
+
+    def job(law):
+        print(f"📘 Fetching: {law['name']}")
+        return scrape_law(law, cache, limiter, previous)
+
+    # Keep only a few laws in flight; each one is written out and released as soon as it is parsed
+    scraped = unchanged = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        pending = set()
+        queue = iter(todo)
+        while True:
+            for law in queue:
+                pending.add(pool.submit(job, law))
+                if len(pending) >= 2 * max(1, args.workers):
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                law, changed = future.result()
+                if law is None:
+                    failed += 1
+                    continue
+                writer.write(law)
+                scraped += 1
+                unchanged += not changed
+
+    if failed:
+        # Leave the partial file so --resume can retry just the failed laws
+        print(f"❌ {failed} laws failed; {scraped} written to {writer.partial_path}. Rerun with --resume.")
+        writer.close(complete=False)
+        return
+    writer.close()
+    print(f"📊 {scraped} laws scraped, {unchanged} unchanged since the last run")
     print("✅ Saved:", out_path)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
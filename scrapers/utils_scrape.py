@@ -11,12 +11,15 @@
     • fetch_html(url)           → جلب HTML خام مع Timeout كبير
     • extract_visible_text(html)→ النص المرئي فقط
     • robust_scrape(url)        → جلب + تنظيف مع إعادة المحاولة
+* HostRateLimiter و HtmlCache و fetch_cached: جلب متوازٍ مهذّب مع كاش على القرص
+  وطلبات شرطية (ETag / Last-Modified).
 """
 
 from __future__ import annotations
 
-import random, re, time
-from typing import List, Tuple
+import hashlib, json, pathlib, random, re, threading, time
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
 
 import cloudscraper
 from requests.adapters import HTTPAdapter, Retry
@@ -72,3 +75,74 @@ def extract_visible_text(html: str) -> str:
     return clean_text(soup.get_text(separator="\n"))
 
 
+class HostRateLimiter:
+    """حد أدنى من الثواني بين طلبين لنفس المضيف، مشترك بين كل الخيوط."""
+
+    def __init__(self, min_interval: float = 1.0):
+        self.min_interval = min_interval
+        self._next_slot: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HtmlCache:
+    """HTML خام لكل رابط على القرص مع ترويسات ETag / Last-Modified لإعادة التحقق."""
+
+    def __init__(self, root: str = "data/html_cache"):
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url: str) -> Tuple[pathlib.Path, pathlib.Path]:
+        key = hashlib.sha256(url.encode("utf8")).hexdigest()
+        return self.root / f"{key}.html", self.root / f"{key}.json"
+
+    def get(self, url: str) -> Tuple[Optional[str], dict]:
+        html_path, meta_path = self._paths(url)
+        if not html_path.exists() or not meta_path.exists():
+            return None, {}
+        return html_path.read_text(encoding="utf8"), json.loads(meta_path.read_text(encoding="utf8"))
+
+    def put(self, url: str, html: str, headers) -> None:
+        html_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        html_path.write_text(html, encoding="utf8")
+        meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf8")
+
+
+def fetch_cached(url: str, cache: Optional[HtmlCache] = None, limiter: Optional[HostRateLimiter] = None,
+                 *, timeout: int = 60) -> Tuple[str, bool]:
+    """
+    جلب الصفحة عبر SESSION بطلب شرطي إن كانت في الكاش.
+    تُرجع (html, changed)؛ changed=False عندما يرد الخادم 304 فيُعاد المحفوظ كما هو.
+    """
+    cached_html, meta = cache.get(url) if cache else (None, {})
+    headers = {}
+    if cached_html is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    if limiter:
+        limiter.wait(url)
+    resp = SESSION.get(url, headers=headers, timeout=timeout)
+    if resp.status_code == 304 and cached_html is not None:
+        return cached_html, False
+    resp.raise_for_status()
+    if cache:
+        cache.put(url, resp.text, resp.headers)
+    # بعض الخوادم لا تدعم الطلبات الشرطية؛ نفس المحتوى يعني أن القانون لم يتغير
+    return resp.text, resp.text != cached_html